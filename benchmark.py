@@ -0,0 +1,408 @@
+"""
+An offline benchmark of the data build (build_data.py).
+
+How?
+
+1. It generates synthetic upstream data for each requested catalogue size:
+a Pyodide package support graph of that many packages spread across many
+Pyodide releases, a sheet of community contributed updates (as CSV) and
+PyPI download stats.
+
+2. It serves these, along with synthetic PyPI JSON metadata for any package
+asked for, from a local mock server (which supports ETag revalidation, like
+the real thing).
+
+3. It runs build_data.py against the mock server in a temporary directory,
+twice: a "cold" run that starts with an empty api/ directory and HTTP cache,
+and a "warm" run straight after it where nothing has changed upstream (and
+every cached response is revalidated).
+
+4. Finally, it reports the wall time, throughput (packages per second), peak
+memory (the maximum resident set size of the build process) and the HTTP
+and file I/O counts from the build's own report, for each run.
+
+Nothing touches the network or the real api/ directory, so the numbers can
+be compared before and after a change to the build. For example:
+
+    python benchmark.py --sizes 1000,10000 --output before.json
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import string
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BUILD_SCRIPT = os.path.join(ROOT, "build_data.py")
+# The pages build_data.py prerenders from, copied into each benchmark.
+TEMPLATES = [os.path.join("package", "index.html"), "index.html"]
+
+# Column headings of the community contributed updates sheet.
+CSV_HEADER = [
+    "Timestamp",
+    "Package name (e.g. pandas, numba, my-cool-lib)",
+    "Suggested status",
+    "Comments about status (Markdown allowed)",
+]
+
+
+#############################################
+# Synthetic upstream data.
+#############################################
+
+
+def package_names(size, rng):
+    """
+    Return the given number of unique, made up package names.
+    """
+    names = []
+    for i in range(size):
+        stem = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9)))
+        separator = rng.choice(["-", "_", ""])
+        names.append(f"{stem}{separator}{i}")
+    return names
+
+
+def pyodide_graph(names, releases, rng):
+    """
+    Return a Pyodide package support graph for the named packages. Most
+    packages are supported from some release onwards; the rest were dropped
+    at some point.
+    """
+    graph = {release: {} for release in releases}
+    for name in names:
+        first = rng.randrange(len(releases))
+        last = len(releases)
+        if rng.random() < 0.2:
+            last = rng.randint(first + 1, len(releases))
+        for position in range(first, last):
+            graph[releases[position]][name] = f"1.{position}.0"
+    return graph
+
+
+def community_csv(names, rows, rng):
+    """
+    Return a sheet of community contributed updates, mostly for the given
+    packages and some for packages that Pyodide doesn't know about.
+    """
+    lines = [",".join(f'"{heading}"' for heading in CSV_HEADER)]
+    start = time.time() - 30 * 24 * 60 * 60
+    for i in range(rows):
+        if rng.random() < 0.8:
+            name = rng.choice(names)
+        else:
+            name = f"community-only-{i}"
+        timestamp = time.strftime(
+            "%d/%m/%Y %H:%M:%S", time.gmtime(start + i * 60)
+        )
+        status = rng.choice(["Green: works", "Amber: partly works", "Red: broken"])
+        comment = f"Checked with **version {i}**, see `{name}`."
+        lines.append(f'{timestamp},{name},{status},"{comment}"')
+    return "\n".join(lines) + "\n"
+
+
+def top_pypi_packages(names, rng):
+    """
+    Return PyPI download stats in which most, but not all, of the top
+    packages are supported by Pyodide.
+    """
+    rows = []
+    for i in range(200):
+        if rng.random() < 0.6:
+            name = rng.choice(names)
+        else:
+            name = f"top-only-{i}"
+        rows.append({"project": name, "download_count": 10_000_000 - i * 1000})
+    return {"last_update": "2026-01-01 00:00:00", "rows": rows}
+
+
+def pypi_json(name):
+    """
+    Return synthetic PyPI JSON metadata for the named package.
+    """
+    return {
+        "info": {
+            "name": name,
+            "summary": f"The {name} package, for benchmarking.",
+            "version": "1.0.0",
+            "author": "Benchmark",
+            "home_page": f"https://example.com/{name}",
+            "requires_python": ">=3.9",
+            "project_urls": {},
+        },
+        "urls": [
+            {
+                "filename": f"{name}-1.0.0-py3-none-any.whl",
+                "packagetype": "bdist_wheel",
+            }
+        ],
+    }
+
+
+#############################################
+# The mock upstream server.
+#############################################
+
+
+class MockUpstream(BaseHTTPRequestHandler):
+    """
+    Serves the synthetic documents in server.documents by path, and PyPI
+    JSON metadata for /pypi/<name>/json. Packages named "top-only-..." are
+    unknown to PyPI, so some 404s are in the mix.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests += 1
+        etag = '"1"'
+        if self.path in self.server.documents:
+            body = self.server.documents[self.path]
+        elif self.path.startswith("/pypi/") and not self.path.startswith(
+            "/pypi/top-only-"
+        ):
+            name = self.path.split("/")[2]
+            body = json.dumps(pypi_json(name)).encode("utf-8")
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(documents):
+    """
+    Start the mock upstream server on a free local port, in a background
+    thread. Returns the server.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockUpstream)
+    server.daemon_threads = True
+    server.documents = documents
+    server.requests = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+#############################################
+# Running the build.
+#############################################
+
+
+def run_build(directory, base_url, extra_args):
+    """
+    Run build_data.py in the directory against the mock server. Returns the
+    wall time, peak memory (in MB, or None if unknown) and the build's own
+    report.
+    """
+    report_file = os.path.join(directory, "report.json")
+    command = [
+        sys.executable,
+        BUILD_SCRIPT,
+        "--csv-url", f"{base_url}/sheet.csv",
+        "--pyodide-graph-url", f"{base_url}/pyodide_graph.json",
+        "--top-pypi-url", f"{base_url}/top-pypi-packages.json",
+        "--pypi-url", f"{base_url}/pypi",
+        "--rate-limit", "0",
+        "--report", report_file,
+        *extra_args,
+    ]
+    with open(os.path.join(directory, "build.log"), "ab") as log:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=directory, stdout=log, stderr=log)
+        peak_memory = None
+        # Not available on Windows, where peak memory isn't reported.
+        if hasattr(os, "wait4"):
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            # Kilobytes on Linux, bytes on macOS.
+            scale = 1024 if sys.platform == "darwin" else 1
+            peak_memory = round(usage.ru_maxrss / scale / 1024, 1)
+        else:
+            process.wait()
+        wall_time = time.perf_counter() - start
+    if process.returncode:
+        raise RuntimeError(
+            f"The build failed, see {os.path.join(directory, 'build.log')}"
+        )
+    with open(report_file, "r") as f:
+        report = json.load(f)
+    return wall_time, peak_memory, report
+
+
+def benchmark(size, releases, csv_rows, seed, extra_args, keep):
+    """
+    Benchmark the cold and warm builds of a catalogue of the given size.
+    Returns a list of results, one for each run.
+    """
+    rng = random.Random(seed)
+    names = package_names(size, rng)
+    documents = {
+        "/pyodide_graph.json": json.dumps(
+            pyodide_graph(names, releases, rng)
+        ).encode("utf-8"),
+        "/sheet.csv": community_csv(names, csv_rows, rng).encode("utf-8"),
+        "/top-pypi-packages.json": json.dumps(
+            top_pypi_packages(names, rng)
+        ).encode("utf-8"),
+    }
+    server = start_server(documents)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    directory = tempfile.mkdtemp(prefix=f"benchmark-{size}-")
+    os.makedirs(os.path.join(directory, "api", "package"))
+    for template in TEMPLATES:
+        os.makedirs(
+            os.path.join(directory, os.path.dirname(template)), exist_ok=True
+        )
+        shutil.copy(os.path.join(ROOT, template), os.path.join(directory, template))
+    results = []
+    try:
+        runs = [("cold", []), ("warm", ["--cache-ttl", "0"])]
+        for name, run_args in runs:
+            print(f"Benchmarking a {name} build of {size} packages...")
+            server.requests = 0
+            wall_time, peak_memory, report = run_build(
+                directory, base_url, extra_args + run_args
+            )
+            totals = report["totals"]
+            results.append(
+                {
+                    "packages": size,
+                    "run": name,
+                    "wall_time": round(wall_time, 3),
+                    "packages_per_second": round(size / wall_time, 1),
+                    "peak_memory_mb": peak_memory,
+                    "upstream_requests": server.requests,
+                    "bytes_downloaded": totals["bytes_downloaded"],
+                    "files_read": totals["files_read"],
+                    "files_written": totals["files_written"],
+                    "stages": {
+                        stage: counters["wall_time"]
+                        for stage, counters in report["stages"].items()
+                    },
+                }
+            )
+    finally:
+        server.shutdown()
+        server.server_close()
+        if keep:
+            print(f"Kept the benchmark files in {directory}")
+        else:
+            shutil.rmtree(directory)
+    return results
+
+
+def print_results(results):
+    columns = [
+        ("packages", "packages"),
+        ("run", "run"),
+        ("wall_time", "time (s)"),
+        ("packages_per_second", "pkgs/s"),
+        ("peak_memory_mb", "peak MB"),
+        ("upstream_requests", "requests"),
+        ("bytes_downloaded", "downloaded"),
+        ("files_read", "read"),
+        ("files_written", "written"),
+    ]
+    rows = [[heading for _, heading in columns]]
+    for result in results:
+        rows.append([str(result[key]) for key, _ in columns])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    for row in rows:
+        print("  ".join(cell.rjust(width) for cell, width in zip(row, widths)))
+    print("Stage timings (s):")
+    for result in results:
+        stages = ", ".join(
+            f"{stage} {wall_time:.2f}"
+            for stage, wall_time in result["stages"].items()
+        )
+        print(f"  {result['packages']} {result['run']}: {stages}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the data build against synthetic upstreams."
+    )
+    parser.add_argument(
+        "--sizes",
+        default="1000,10000,50000",
+        help="Comma separated catalogue sizes (default: 1000,10000,50000).",
+    )
+    parser.add_argument(
+        "--releases",
+        type=int,
+        default=24,
+        help="Number of Pyodide releases in the graph (default: 24).",
+    )
+    parser.add_argument(
+        "--csv-rows",
+        type=int,
+        help=(
+            "Number of community contributed updates (default: 5%% of the "
+            "catalogue size)."
+        ),
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=1,
+        help="Seed for the synthetic data (default: 1).",
+    )
+    parser.add_argument(
+        "--output",
+        help="Write the results to this file as JSON.",
+    )
+    parser.add_argument(
+        "--keep",
+        action="store_true",
+        help="Keep the temporary build directories.",
+    )
+    parser.add_argument(
+        "build_args",
+        nargs="*",
+        help="Extra arguments for build_data.py (after --).",
+    )
+    args = parser.parse_args(argv)
+    releases = [f"0.{20 + i // 4}.{i % 4}" for i in range(args.releases)]
+    results = []
+    for size in (int(size) for size in args.sizes.split(",")):
+        csv_rows = args.csv_rows
+        if csv_rows is None:
+            csv_rows = max(1, size // 20)
+        results.extend(
+            benchmark(
+                size, releases, csv_rows, args.seed, args.build_args, args.keep
+            )
+        )
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"Wrote the results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 """
-This is a VERY simple script to build the static JSON data files used by the
-package support detail page in the PyScript documentation site.
+This script builds the static JSON data files used by the package support
+detail page in the PyScript documentation site.
 
 How?
 
@@ -14,224 +14,500 @@ files found here:
 https://raw.githubusercontent.com/pyscript/polyscript/refs/heads/main/rollup/pyodide_graph.json
 
 Then iterates over them to generate individual package JSON files used by
-the package support detail page. These end up in the /api/packages directory.
+the package support detail page. These end up in the /api/packages directory,
+named as per PEP 503 (see PackageStore in package_store.py).
 If there has not been an update to the supported versions of Pyodide for a
 given package, the existing JSON file is preserved to avoid overwriting any
 community contributed updates.
 
+A changes feed (changes.json, with the details of each release in
+/api/changes/) records which packages were added, removed or updated from
+one Pyodide release to the next.
+
+Each package file also records the small subset of the package's PyPI
+metadata shown on the package page (see pypi_subset in build_http.py), so
+the browser doesn't need to fetch it from PyPI. This is captured whenever a
+package is updated (use --refresh-pypi to fetch it afresh for all packages,
+including any recorded before it was captured, whichever stages are run).
+
+The Markdown notes for each package are also rendered to sanitized HTML and
+stored alongside them (as notes_html), so the package page doesn't need to
+load a Markdown renderer. This needs the optional markdown and nh3 packages.
+Only the notes of changed packages are rendered (use --render-notes to
+render them for all packages, e.g. after installing or upgrading those).
+
 3. It also grabs the download stats for PyPI and creates a JSON description
 including info about the top 100 packages by download count and whether
-they are supported in Pyodide.
+they are supported in Pyodide. The top --top packages (100 by default) are
+also listed in pages in /api/top/, with stats.json aggregating the share of
+their downloads with each status and in each Pyodide release.
 
 4. Finally, it records when the script was last run to avoid overwriting
 newer community contributed updates, and generates an all.json file
-containing all package data for easy access.
+containing all package data for easy access. Alongside it go a minified
+index.json (just the name, status, summary and latest supported Pyodide
+version of each package), minified shards of the full data split by the
+first character of the package name (in /api/shard/), and a sizes.json
+report of the payload size of these files. Finally, a search.json index of
+all known package names (PEP 503 normalized, sorted for prefix lookups, and
+with a trigram index for fuzzy matching) powers the home page's as-you-type
+suggestions, and a support matrix (matrix.json and matrix.npy) records which
+version of each package is in each Pyodide release, for bulk queries. The
+same data, keyed by normalized package name, is in lookup.json for checking
+whole lists of requirements (see check_requirements.py). A page for each
+package (in /package/) and the list of top packages on the home page are
+also prerendered, so they show their content before PyScript starts. And
+precache.json lists every data file and prerendered page with a hash of its
+content, for the site's service worker (sw.js) to cache them by.
+
+PyPI metadata (package summaries) needed by the steps above is collected up
+front and fetched concurrently through a pooled session, with retries,
+backoff and a per-host rate limit. Use --help to see how to tune these.
+
+All upstream responses are cached in the .cache/ directory and revalidated
+with conditional requests (ETag / Last-Modified), so a run where nothing
+has changed upstream costs next to no traffic. Use --offline to build
+purely from the cache.
+
+Each of the four steps above is a stage that can be run on its own (or with
+the others) via --stage, e.g. --stage top100,aggregate. Whichever stages run,
+the changed package files and last run time are written out in between the
+top100 and aggregate stages. Use --dry-run to do everything except write the
+data files, and --report to save a JSON report of the wall time, HTTP
+requests, bytes downloaded and files read and written by each stage (a
+summary of which is always printed at the end, along with any warnings and
+which packages changed, and why).
+
+Progress is logged to stderr, with a compact progress indicator for the
+long loops when run in a terminal. Use -v to also log the detail of every
+package processed, or -q to only log warnings. Use --events to save a JSON
+lines stream of the start and end (with the counts) of each stage, the
+warnings and the changed packages, for tools to consume.
 
-This is a DELIBERATELY simple script without much error handling or
-sophistication. It is intended to be run occasionally by hand to refresh
-the data files. Since this website is advertised as being "curated" this
-manual step is REQUIRED, so that we can review the changes before pushing
-them live via a git based PR.
+The stages are in this script, and the layers they share are in modules
+alongside it:
+
+* build_http.py: the pooled session, the HTTP cache and fetching from PyPI.
+* package_store.py: the per-package records (PackageStore).
+* build_log.py: the logging, the counters of each stage, the event stream
+  and the summary.
+* build_output.py: writing the data files (atomically, and only when
+  changed).
+* prerender.py: rendering the notes, and prerendering the package pages and
+  the home page.
+* releases.py: the Pyodide releases and the PyScript releases that use them.
+
+The script is intended to be run occasionally by hand to refresh the data
+files. Since this website is advertised as being "curated" this manual step
+is REQUIRED, so that we can review the changes before pushing them live via
+a git based PR. That's why anything that needs a look (packages dropped
+by the latest Pyodide release, packages PyPI knows nothing about, notes
+that can't be rendered) is logged as a warning and listed in the summary,
+rather than stopping the run.
 """
 
-import requests
-import json
-import datetime
+import argparse
 import csv
+import datetime
+import gzip
+import hashlib
+import json
 import os
-from io import StringIO
-
-
-PYSCRIPT_PYODIDE_MAP = {
-  "2024.10.1": "0.26.2",
-  "2024.10.2": "0.26.3",
-  "2024.11.1": "0.26.4",
-  "2025.2.1": "0.26.4",
-  "2025.2.2": "0.27.2",
-  "2025.2.3": "0.27.2",
-  "2025.2.4": "0.27.2",
-  "2025.3.1": "0.27.3",
-  "2025.5.1": "0.27.6",
-  "2025.7.1": "0.27.7",
-  "2025.7.2": "0.27.7",
-  "2025.7.3": "0.27.7",
-  "2025.8.1": "0.28.1",
-  "2025.10.1": "0.29.0",
-  "2025.10.2": "0.29.0",
-  "2025.10.3": "0.29.0",
-  "2025.11.1": "0.29.0",
-  "2026.1.1": "0.29.1",
-}
-
-PYODIDE_PYSCRIPT_MAP = {
-  v: k for k, v in PYSCRIPT_PYODIDE_MAP.items()
-}
+import re
+import time
+from array import array
+
+import build_http
+from build_http import (
+    fetch_pypi_metadata,
+    http_get,
+    http_open,
+    pypi_subset,
+    setup_http,
+)
+from build_log import (
+    Progress,
+    close_events,
+    count,
+    log,
+    new_counters,
+    package_changed,
+    package_changes,
+    print_summary,
+    run_stage,
+    setup_logging,
+    stats,
+    warnings_logged,
+)
+from build_output import (
+    atomic_write,
+    minified,
+    npy_file,
+    setup_output,
+    write_api_file,
+    write_if_changed,
+    write_output,
+)
+from package_store import PackageStore, normalize_name
+from prerender import HOME_PAGE, build_static_pages, markdown, render_notes
+from releases import ReleaseIndex, release_key
+
+try:
+    # Optional: only needed to report the Brotli compressed payload sizes.
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Where the upstream data comes from.
+CSV_URL = "https://docs.google.com/spreadsheets/d/e/2PACX-1vQRcJ_Co69zrLdxbOi7b5zlO7fuqooypL5ejpVPe59YC1CPXHWA-MpLhJBpGJ44FkM0ewmwMo7yq27Z/pub?output=csv"
+PYODIDE_GRAPH_URL = "https://raw.githubusercontent.com/pyscript/polyscript/refs/heads/main/rollup/pyodide_graph.json"
+# HugoVK generates these stats each month.
+TOP_PYPI_URL = "https://hugovk.github.io/top-pypi-packages/top-pypi-packages.json"
+
+# The stages of the build, in the order they run. See main.
+STAGES = ["community", "pyodide", "top100", "aggregate"]
+
+parser = argparse.ArgumentParser(description="Refresh the static API data.")
+parser.add_argument(
+    "--concurrency",
+    type=int,
+    default=16,
+    help="Maximum number of concurrent PyPI requests (default: 16).",
+)
+parser.add_argument(
+    "--rate-limit",
+    type=float,
+    default=50,
+    help="Maximum requests per second to any one host (default: 50).",
+)
+parser.add_argument(
+    "--retries",
+    type=int,
+    default=3,
+    help="Number of retries for failed requests (default: 3).",
+)
+parser.add_argument(
+    "--pypi-url",
+    default="https://pypi.org/pypi",
+    help="Base URL of the PyPI JSON API (e.g. a local stand-in server).",
+)
+parser.add_argument(
+    "--csv-url",
+    default=CSV_URL,
+    help="URL of the community contributed updates (published as CSV).",
+)
+parser.add_argument(
+    "--pyodide-graph-url",
+    default=PYODIDE_GRAPH_URL,
+    help="URL of the Pyodide package support data.",
+)
+parser.add_argument(
+    "--top-pypi-url",
+    default=TOP_PYPI_URL,
+    help="URL of the PyPI download stats.",
+)
+parser.add_argument(
+    "--top",
+    type=int,
+    default=100,
+    help="Number of the most downloaded PyPI packages to list (default: 100).",
+)
+parser.add_argument(
+    "--refresh-pypi",
+    action="store_true",
+    help="Refresh the PyPI metadata recorded for every package.",
+)
+parser.add_argument(
+    "--render-notes",
+    action="store_true",
+    help="Render the notes of every package to HTML, not just changed ones.",
+)
+parser.add_argument(
+    "--offline",
+    action="store_true",
+    help="Serve all upstream data from the HTTP cache; never use the network.",
+)
+parser.add_argument(
+    "--cache-ttl",
+    type=float,
+    default=3600,
+    help=(
+        "Seconds a cached response is used without revalidating it "
+        "(default: 3600)."
+    ),
+)
+parser.add_argument(
+    "--compress",
+    action="store_true",
+    help=(
+        "Also write pre-compressed .gz (and .br, if the brotli package is "
+        "installed) copies of the compact API files."
+    ),
+)
+parser.add_argument(
+    "--cache-size",
+    type=float,
+    default=256,
+    help="Maximum size of the HTTP cache in MB (default: 256).",
+)
+parser.add_argument(
+    "--stage",
+    default=",".join(STAGES),
+    help=(
+        "Comma separated stages to run, from: "
+        f"{', '.join(STAGES)} (default: all of them)."
+    ),
+)
+parser.add_argument(
+    "--dry-run",
+    action="store_true",
+    help=(
+        "Do everything except write the data files (upstream responses are "
+        "still cached)."
+    ),
+)
+parser.add_argument(
+    "--report",
+    help="Write a JSON report of the time and I/O of each stage to this file.",
+)
+parser.add_argument(
+    "--events",
+    help=(
+        "Write a stream of JSON lines events (the start and end of each "
+        "stage, warnings and changed packages) to this file."
+    ),
+)
+parser.add_argument(
+    "-v",
+    "--verbose",
+    action="store_true",
+    help="Log the detail of every package processed.",
+)
+parser.add_argument(
+    "-q",
+    "--quiet",
+    action="store_true",
+    help="Only log warnings (and the summary at the end).",
+)
+
+# The parsed command line arguments, set by configure.
+args = None
 
 
 #############################################
-# Step 1: Process community contributed package status updates.
+# Stage: community.
+# Process community contributed package status updates.
 #############################################
-print("Processing community contributed package status updates...")
 
 
-# Discover when the script was last run to avoid overwriting newer data.
-if os.path.exists(os.path.join("api", "last_run.json")):
-    with open(os.path.join("api", "last_run.json"), "r") as f:
-        last_run_data = json.load(f)
-    last_run_time = datetime.datetime.fromisoformat(
-        last_run_data.get("last_run")
-    )
-else:
-    last_run_time = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
-
-CSV_URL = "https://docs.google.com/spreadsheets/d/e/2PACX-1vQRcJ_Co69zrLdxbOi7b5zlO7fuqooypL5ejpVPe59YC1CPXHWA-MpLhJBpGJ44FkM0ewmwMo7yq27Z/pub?output=csv"
-response = requests.get(CSV_URL)
-response.raise_for_status()
-csv_file = StringIO(response.text)
-reader = csv.DictReader(csv_file)
-for row in reader:
-    timestamp = datetime.datetime.strptime(
-        row.get("Timestamp"), "%d/%m/%Y %H:%M:%S"
-    ).replace(tzinfo=datetime.timezone.utc)
-    if timestamp <= last_run_time:
-        # This update is older than the last run of the script, so skip it.
-        continue
-    package_name = row.get("Package name (e.g. pandas, numba, my-cool-lib)")
-    print(f"Processing community update for package: {package_name}")
-    status = row.get("Suggested status").lower()
-    if "red" in status:
-        status = "red"
-    elif "green" in status:
-        status = "green"
-    else:
-        status = "amber"
-    notes = row.get("Comments about status (Markdown allowed)")
-    filename = os.path.join("api", "package", f"{package_name}.json")
+def read_last_run():
+    """
+    Return the contents of api/last_run.json, or an empty dict if the script
+    has never been run.
+    """
     try:
-        with open(filename, "r") as f:
-            data = json.load(f)
+        with open(os.path.join("api", "last_run.json"), "r") as f:
+            last_run_data = json.load(f)
     except FileNotFoundError:
-        data = {"supported_versions": {}, "summary": None}
-    if not data["summary"]:
-        # Try to fetch the summary from PyPI.
-        pypi_url = f"https://pypi.org/pypi/{package_name}/json"
-        pypi_response = requests.get(pypi_url)
-        if pypi_response.status_code == 200:
-            pypi_data = pypi_response.json()
-            data["summary"] = pypi_data["info"].get("summary", "")
-        else:
-            data["summary"] = ""
-    data["status"] = status
-    if notes:
-        data["notes"] = notes
-    data["updated_by"] = "Community contribution via Google Forms"
-    data["updated_at"] = timestamp.isoformat()
-    print(
-        f"Updating package '{package_name}' with community status '{status}'"
-    )
-    with open(filename, "w") as f:
-        json.dump(data, f, indent=4)
+        return {}
+    count("files_read")
+    return last_run_data
 
 
-############################################
-# Step 2: Generate per-package JSON files from Pyodide data.
-############################################
-print("Generating per-package JSON files from Pyodide data...")
+def csv_records(csv_file, reader_state):
+    """
+    Yield the text lines of the binary CSV file, keeping track (in the
+    reader_state dict) of the byte offset just after the last line read.
 
+    Since the csv module only reads as many lines as it needs for each row,
+    this is also the offset just after the last row it returned.
+    """
+    for line in csv_file:
+        reader_state["offset"] += len(line)
+        reader_state["tail"] = line
+        yield line.decode("utf-8")
 
-# Grab the raw JSON data
-response = requests.get(
-    "https://raw.githubusercontent.com/pyscript/polyscript/refs/heads/main/rollup/pyodide_graph.json"
-)
-response.raise_for_status()
-package_data = response.json()
-
-
-# To hold the per-package data to later be turned into JSON files.
-packages = {}
-
-# Get the latest release of Pyodide.
-latest_release = max([k for k in package_data.keys() if k not in {"latest", "stable"}])
-print(f"Latest Pyodide release detected: {latest_release}")
-
-# Iterate over the releases of Pyodide
-for release, package_list in package_data.items():
-    print(f"Processing release: {release}")
-    if release in {"latest", "stable"}:
-        continue
-    for package_name, version in package_list.items():
-        print(f"  Processing package: {package_name}")
-        if package_name not in packages:
-            packages[package_name] = {}
-        # Add the supported version of this package for the given release of
-        # Pyodide.
-        packages[package_name][release] = {
-            "package_version": version,
-            "pyscript_version": PYODIDE_PYSCRIPT_MAP.get(release, "unknown")
-        }
 
+def read_community_updates(csv_file, high_water_mark, last_run_time):
+    """
+    Read the community contributed updates made since the last run from the
+    CSV file, returning the latest update for each package (as a dict
+    mapping package name to a (timestamp, row) tuple), the new high water
+    mark and the timestamp of the newest row read (or None if no rows were
+    read).
 
-updated_by = "automated script"
-updated_at = datetime.datetime.now(tz=datetime.timezone.utc).isoformat()
-# Write out the per-package JSON files
-for package_name, data in packages.items():
-    # Package names are case insensitive, so we convert to lowercase.
-    package_name = package_name.lower()
-    print(f"Processing package data for: {package_name}")
-    # Check if the package already has a JSON file (possibly updated by
-    # community contributions) and preserve any existing notes.
-    filename = os.path.join("api", "package", f"{package_name}.json")
-    try:
-        with open(filename, "r") as f:
-            existing_data = json.load(f)
-        notes = existing_data.get("notes", "")
-        updated_by = existing_data.get("updated_by", updated_by)
-        updated_at = existing_data.get("updated_at", updated_at)
-    except FileNotFoundError:
-        notes = ""
-    # Check if the supported versions of Pyodide have changed; if not, skip
-    # rewriting the file.
-    if os.path.exists(filename):
-        with open(filename, "r") as f:
-            existing_data = json.load(f)
-        if existing_data.get("pyodide_versions", {}) == data:
-            print(
-                f"No changes in supported versions for package '{package_name}'. Skipping."
-            )
-            continue
+    The form responses are only ever appended to the sheet, so the high
+    water mark records the byte offset of the end of the rows processed by
+    the previous run, along with a hash of the last of those rows. If that
+    row is still where we left it, the rows before it are skipped without
+    being read at all. Otherwise the whole sheet is read again (but only
+    updates since the last run are ever applied).
+    """
+    reader_state = {"offset": 0, "tail": b""}
+    reader = csv.reader(csv_records(csv_file, reader_state))
+    header = next(reader)
+    columns = {name: position for position, name in enumerate(header)}
+    offset = high_water_mark.get("offset", 0)
+    tail_length = high_water_mark.get("tail_length", 0)
+    if offset > reader_state["offset"] and tail_length:
+        csv_file.seek(offset - tail_length)
+        tail = csv_file.read(tail_length)
+        if hashlib.sha256(tail).hexdigest() == high_water_mark.get("tail"):
+            log.info("Skipping community updates before byte %d.", offset)
+            reader_state["offset"] = offset
         else:
-            print(
-                f"Changes detected in supported Pyodide versions for package '{package_name}'. Updating."
+            log.info("Community updates sheet has changed, reading it all.")
+            csv_file.seek(reader_state["offset"])
+    latest_updates = {}
+    rows_scanned = 0
+    newest = None
+    name_column = columns["Package name (e.g. pandas, numba, my-cool-lib)"]
+    for row in reader:
+        rows_scanned += 1
+        timestamp = datetime.datetime.strptime(
+            row[columns["Timestamp"]], "%d/%m/%Y %H:%M:%S"
+        ).replace(tzinfo=datetime.timezone.utc)
+        if newest is None or timestamp > newest:
+            newest = timestamp
+        if timestamp <= last_run_time:
+            # This update is older than the last run of the script, so skip it.
+            continue
+        package_name = normalize_name(row[name_column])
+        # Only the latest update for each package matters.
+        if (
+            package_name not in latest_updates
+            or timestamp >= latest_updates[package_name][0]
+        ):
+            latest_updates[package_name] = (
+                timestamp,
+                dict(zip(header, row)),
             )
-            notes = ""  # Reset notes to repopulate with updated info.
-    # Check if the latest release of Pyodide supports this package.
-    has_latest = True
-    if latest_release not in data:
-        print(
-            f"Warning: Latest Pyodide release '{latest_release}' does not support package '{package_name}'. Warning added to notes."
+    if rows_scanned:
+        high_water_mark = {
+            "offset": reader_state["offset"],
+            "tail_length": len(reader_state["tail"]),
+            "tail": hashlib.sha256(reader_state["tail"]).hexdigest(),
+        }
+    log.info(
+        "Scanned %d community update rows, %d packages to update.",
+        rows_scanned,
+        len(latest_updates),
+    )
+    return latest_updates, high_water_mark, newest
+
+
+def community_run_record(last_run_data):
+    """
+    Return the record of how far through the sheet of community updates the
+    last run got, from api/last_run.json. Older builds only recorded when
+    the whole script was last run, which is then taken as the cutoff.
+    """
+    community_run = dict(last_run_data.get("community_updates") or {})
+    if not community_run.get("last_run") and last_run_data.get("last_run"):
+        community_run["last_run"] = last_run_data["last_run"]
+    return community_run
+
+
+def update_from_community(store, last_run_data):
+    """
+    Apply the community contributed updates made since they were last
+    processed. Returns the new record of how far through the sheet of
+    updates we got, to be kept in api/last_run.json.
+
+    The sheet is always revalidated, rather than served from the HTTP cache
+    while fresh, and the cutoff for the next run is the timestamp of the
+    newest update read (not the time of this run), so updates submitted
+    after the sheet was fetched are never skipped. In offline mode the
+    cached sheet may be out of date, so the record is left as it was.
+    """
+    log.info("Processing community contributed package status updates...")
+    community_run = community_run_record(last_run_data)
+    if community_run.get("last_run"):
+        last_run_time = datetime.datetime.fromisoformat(
+            community_run["last_run"]
+        )
+    else:
+        last_run_time = datetime.datetime(
+            2025, 1, 1, tzinfo=datetime.timezone.utc
         )
-        has_latest = False
-    # Fetch the package summary from PyPI
-    response = requests.get(f"https://pypi.org/pypi/{package_name}/json")
-    if response.status_code != 200:
-        print(
-            f"Warning: Could not fetch PyPI metadata for package '{package_name}'. Skipping."
+
+    with http_open(args.csv_url, revalidate=True) as csv_file:
+        latest_updates, high_water_mark, newest = read_community_updates(
+            csv_file, community_run, last_run_time
+        )
+    updates = sorted(latest_updates.values(), key=lambda update: update[0])
+
+    # Load the existing data for each updated package, so any missing
+    # summaries can be fetched from PyPI in one concurrent batch.
+    community_data = {}
+    for timestamp, row in updates:
+        package_name = normalize_name(
+            row.get("Package name (e.g. pandas, numba, my-cool-lib)")
         )
-        continue
-    pypi_metadata = response.json()
-    summary = pypi_metadata.get("info", {}).get(
-        "summary", "No summary available."
+        if package_name not in community_data:
+            community_data[package_name] = store.get(package_name) or {
+                "supported_versions": {},
+                "summary": None,
+            }
+    pypi_metadata = fetch_pypi_metadata(
+        package_name
+        for package_name, data in community_data.items()
+        if not data.get("summary")
     )
-    if not summary:
-        # Some packages have an empty string or None as summary.
-        summary = "No summary available."
-    pyodide_versions = [f"`{version}`" for version in data.keys()]
-    if not notes:
-        if has_latest:
-            header = f"Great news! The package `{package_name}` is [officially supported](https://pyodide.org/en/stable/usage/packages-in-pyodide.html) in the latest Pyodide release used by PyScript.\n\n"
+
+    for timestamp, row in updates:
+        package_name = normalize_name(
+            row.get("Package name (e.g. pandas, numba, my-cool-lib)")
+        )
+        log.debug("Processing community update for package: %s", package_name)
+        status = row.get("Suggested status").lower()
+        if "red" in status:
+            status = "red"
+        elif "green" in status:
+            status = "green"
         else:
-            header = f"⚠️ The package `{package_name}` has been supported in previous versions of Pyodide, but is not supported in the latest Pyodide release (used by default in PyScript). Supported versions of Pyodide and PyScript are listed below, and details of how to pin PyScript to use a specific version of Pyodide can be [found here](https://docs.pyscript.net/2025.11.1/user-guide/configuration/#interpreter).\n\n"
-        notes = header + f"""To use it in PyScript simply add it to the `packages` section of your TOML configuration like this:
+            status = "amber"
+        notes = row.get("Comments about status (Markdown allowed)")
+        data = community_data[package_name]
+        if not data.get("summary"):
+            metadata = pypi_metadata.get(package_name)
+            if metadata:
+                data["summary"] = metadata["info"].get("summary", "")
+                data["pypi"] = pypi_subset(metadata)
+            else:
+                data["summary"] = ""
+        data["status"] = status
+        if notes:
+            data["notes"] = notes
+        data["updated_by"] = "Community contribution via Google Forms"
+        data["updated_at"] = timestamp.isoformat()
+        store.put(package_name, data)
+        package_changed(package_name, "community", status=status)
+    log.info("Applied %d community updates.", len(updates))
+    if args.offline:
+        return community_run
+    if newest and newest > last_run_time:
+        last_run_time = newest
+    return {**high_water_mark, "last_run": last_run_time.isoformat()}
+
+
+############################################
+# Stage: pyodide.
+# Generate per-package JSON files from Pyodide data.
+############################################
+
+
+def pyodide_notes(package_name, data, has_latest, index):
+    """
+    The default Markdown notes for a package supported by Pyodide, listing
+    the Pyodide (and PyScript) releases that include it.
+    """
+    if has_latest:
+        header = f"Great news! The package `{package_name}` is [officially supported](https://pyodide.org/en/stable/usage/packages-in-pyodide.html) in the latest Pyodide release used by PyScript.\n\n"
+    else:
+        header = f"⚠️ The package `{package_name}` has been supported in previous versions of Pyodide, but is not supported in the latest Pyodide release (used by default in PyScript). Supported versions of Pyodide and PyScript are listed below, and details of how to pin PyScript to use a specific version of Pyodide can be [found here](https://docs.pyscript.net/2025.11.1/user-guide/configuration/#interpreter).\n\n"
+    notes = header + f"""To use it in PyScript simply add it to the `packages` section of your TOML configuration like this:
 
 ```
 packages = ["{package_name}" ]
@@ -251,98 +527,1003 @@ Specifically, the following versions of the package are available for the follow
 
 Pyodide version: package name (version) (PyScript Version)
 """
-        for k in sorted(data.keys(), reverse=True):
-            notes += f"\n* {k}: {package_name} ({data[k]['package_version']})"
-            pyscript_version = data[k]["pyscript_version"]
-            if pyscript_version != "unknown":
-                notes += f" ([PyScript {pyscript_version}](https://pyscript.net/releases/{pyscript_version}/))"
-    output = {
-        "status": "green",
-        "notes": notes,
-        "pyodide_versions": data,
-        "updated_by": updated_by,
-        "updated_at": updated_at,
-        "summary": summary,
-    }
-    filename = os.path.join("api", "package", f"{package_name}.json")
-    print(f"Writing data for package '{package_name}' to '{filename}'")
-    with open(filename, "w") as f:
-        json.dump(output, f, indent=4)
+    for k in index.newest_first(data):
+        notes += f"\n* {k}: {package_name} ({data[k]['package_version']})"
+        pyscript_version = data[k]["pyscript_version"]
+        if pyscript_version != "unknown":
+            notes += f" ([PyScript {pyscript_version}](https://pyscript.net/releases/{pyscript_version}/))"
+    return notes
+
+
+def build_release_changes(package_data, index):
+    """
+    Generate the changes feed: which packages were added, removed or had
+    their version changed between each pair of consecutive Pyodide
+    releases, in a single pass over the releases in version order.
+
+    Each release's changes go in its own file in /api/changes/, and
+    changes.json lists the releases (newest first) with a count of each kind
+    of change, so consumers can poll it and fetch only the changes they
+    haven't yet seen rather than all.json.
+    """
+    releases = index.releases
+    changes_dir = os.path.join("api", "changes")
+    feed = {"latest_release": index.latest, "releases": []}
+    outputs = {}
+    previous_release, previous = None, {}
+    for release in releases:
+        # Package names are compared as per PEP 503.
+        current = {
+            normalize_name(package_name): version
+            for package_name, version in package_data[release].items()
+        }
+        diff = {
+            "release": release,
+            "previous_release": previous_release,
+            "pyscript_version": index.pyscript_version(release),
+            "added": {},
+            "removed": {},
+            "updated": {},
+        }
+        for package_name in sorted(current):
+            version = current[package_name]
+            if package_name not in previous:
+                diff["added"][package_name] = version
+            elif previous[package_name] != version:
+                diff["updated"][package_name] = {
+                    "from": previous[package_name],
+                    "to": version,
+                }
+        for package_name in sorted(set(previous) - set(current)):
+            diff["removed"][package_name] = previous[package_name]
+        outputs[os.path.join(changes_dir, f"{release}.json")] = minified(diff)
+        feed["releases"].insert(
+            0,
+            {
+                "release": release,
+                "previous_release": previous_release,
+                "pyscript_version": diff["pyscript_version"],
+                "added": len(diff["added"]),
+                "removed": len(diff["removed"]),
+                "updated": len(diff["updated"]),
+            },
+        )
+        previous_release, previous = release, current
+    if not args.dry_run:
+        os.makedirs(changes_dir, exist_ok=True)
+        for entry in os.scandir(changes_dir):
+            if entry.path not in outputs:
+                # Releases no longer in the Pyodide data.
+                os.remove(entry.path)
+    for filename, content in outputs.items():
+        write_if_changed(filename, content)
+    write_if_changed(
+        os.path.join("api", "changes.json"), json.dumps(feed, indent=4)
+    )
+    log.info(
+        "Generated api/changes.json covering %d Pyodide releases", len(releases)
+    )
+
+
+def update_from_pyodide(store):
+    """
+    Update the packages whose support in Pyodide has changed, and fill in
+    the PyPI metadata of changed packages that lack it.
+    """
+    log.info("Generating per-package JSON files from Pyodide data...")
+
+    # Grab the raw JSON data
+    response = http_get(args.pyodide_graph_url)
+    response.raise_for_status()
+    package_data = response.json()
+
+    # To hold the per-package data to later be turned into JSON files.
+    packages = {}
+
+    # Put the releases of Pyodide in order, and get the latest one.
+    index = ReleaseIndex(package_data)
+    latest_release = index.latest
+    log.info("Latest Pyodide release detected: %s", latest_release)
+
+    # Record what changed from one release to the next.
+    build_release_changes(package_data, index)
+
+    # Iterate over the releases of Pyodide, newest first (as they're listed
+    # in the package files).
+    for ordinal in reversed(range(len(index.releases))):
+        release = index.releases[ordinal]
+        log.debug("Processing release: %s", release)
+        pyscript_version = index.pyscript_versions[ordinal]
+        for package_name, version in package_data[release].items():
+            log.debug("  Processing package: %s", package_name)
+            # Package names are case insensitive (and so on, as per PEP 503),
+            # and Pyodide hasn't always spelled them the same way.
+            package_name = store.alias(package_name)
+            if package_name not in packages:
+                packages[package_name] = {}
+            # Add the supported version of this package for the given release
+            # of Pyodide.
+            packages[package_name][release] = {
+                "package_version": version,
+                "pyscript_version": pyscript_version,
+            }
+
+    # Work out which packages have new or changed Pyodide support and so need
+    # their JSON file (re)writing.
+    changed_packages = {}
+    progress = Progress("Processing packages", len(packages))
+    for package_name, data in packages.items():
+        progress.update()
+        log.debug("Processing package data for: %s", package_name)
+        updated_by = "automated script"
+        updated_at = datetime.datetime.now(tz=datetime.timezone.utc).isoformat()
+        # Check if the package already has a JSON file (possibly updated by
+        # community contributions) and preserve any existing notes.
+        existing_data = store.get(package_name)
+        notes = ""
+        if existing_data:
+            notes = existing_data.get("notes", "")
+            updated_by = existing_data.get("updated_by", updated_by)
+            updated_at = existing_data.get("updated_at", updated_at)
+            # Check if the supported versions of Pyodide have changed; if
+            # not, skip rewriting the file.
+            if existing_data.get("pyodide_versions", {}) == data:
+                log.debug(
+                    "No changes in supported versions for package '%s'. Skipping.",
+                    package_name,
+                )
+                continue
+            else:
+                log.debug(
+                    "Changes detected in supported Pyodide versions for package '%s'. Updating.",
+                    package_name,
+                )
+                notes = ""  # Reset notes to repopulate with updated info.
+        changed_packages[package_name] = (data, notes, updated_by, updated_at)
+    Progress.clear()
+
+    # Fetch the package summaries from PyPI in one concurrent batch.
+    pypi_metadata = fetch_pypi_metadata(changed_packages)
+
+    # Write out the per-package JSON files
+    for package_name, (data, notes, updated_by, updated_at) in changed_packages.items():
+        # Check if the latest release of Pyodide supports this package.
+        has_latest = True
+        if latest_release not in data:
+            log.warning(
+                "Latest Pyodide release '%s' does not support package '%s'. Warning added to notes.",
+                latest_release,
+                package_name,
+                extra={"package": package_name},
+            )
+            has_latest = False
+        pypi_package = pypi_metadata.get(package_name)
+        if not pypi_package:
+            log.warning(
+                "Could not fetch PyPI metadata for package '%s'. Skipping.",
+                package_name,
+                extra={"package": package_name},
+            )
+            continue
+        summary = pypi_package.get("info", {}).get(
+            "summary", "No summary available."
+        )
+        if not summary:
+            # Some packages have an empty string or None as summary.
+            summary = "No summary available."
+        if not notes:
+            notes = pyodide_notes(package_name, data, has_latest, index)
+        output = {
+            "status": "green",
+            "notes": notes,
+            "pyodide_versions": data,
+            "updated_by": updated_by,
+            "updated_at": updated_at,
+            "summary": summary,
+            "pypi": pypi_subset(pypi_package),
+        }
+        store.put(package_name, output)
+        package_changed(package_name, "pyodide")
+
+    # Fill in the PyPI metadata shown on the package page for the changed
+    # packages that don't have it yet.
+    update_pypi_details(
+        store,
+        [
+            package_name
+            for package_name in sorted(store.dirty)
+            if "pypi" not in store.get(package_name)
+        ],
+    )
+
+
+def update_pypi_details(store, package_names):
+    """
+    Fetch and record the PyPI metadata shown on the package page for the
+    named packages, where it has changed.
+    """
+    pypi_metadata = fetch_pypi_metadata(package_names)
+    for package_name in package_names:
+        if not pypi_metadata.get(package_name):
+            continue
+        data = store.get(package_name)
+        pypi = pypi_subset(pypi_metadata[package_name])
+        if data.get("pypi") != pypi:
+            data["pypi"] = pypi
+            store.put(package_name, data)
+            package_changed(package_name, "pypi")
+
+
+def refresh_pypi(store):
+    """
+    Refresh the PyPI metadata recorded for every package (which loads every
+    package file), for --refresh-pypi.
+    """
+    log.info("Refreshing the PyPI metadata of every package...")
+    update_pypi_details(store, store.names())
+
 
 #############################################
-# Step 3: Generate top_100_pypi_packages.json
+# Stage: top100.
+# Generate top_100_pypi_packages.json and the other top packages files.
 #############################################
-print("Generating top_100_pypi_packages.json...")
 
-# HugoVK generates these stats each month.
-url = "https://hugovk.github.io/top-pypi-packages/top-pypi-packages.json"
-response = requests.get(url)
-response.raise_for_status()
-top_pypi_data = response.json()
-
-last_updated = top_pypi_data.get("last_update", "unknown")
-top100 = top_pypi_data.get("rows", [])[:100]
-
-# Create a summary JSON file for the top 100 packages. Include a check of the
-# Pyodide support status from the previously generated data in the /data/
-# directory, if it exists. Otherwise, default to "amber" status.
-summary = {"last_updated": last_updated, "packages": []}
-for entry in top100:
-    package_name = entry.get("project")
-    print("Processing top package: ", package_name)
-    downloads = entry.get("download_count", 0)
-    # Check for support data
-    try:
-        with open(
-            os.path.join("api", "package", f"{package_name}.json"), "r"
-        ) as f:
-            support_data = json.load(f)
+# The number of packages in each page of the top packages (/api/top/). This
+# must match home.py.
+TOP_PAGE_SIZE = 100
+
+
+def top_package_stats(packages, store, last_updated):
+    """
+    Return the aggregate stats of the top packages: how many of them, and
+    what share of their downloads, have each status and are included in
+    each Pyodide release.
+    """
+    total = sum(package["downloads"] for package in packages)
+    statuses = {
+        status: {"packages": 0, "downloads": 0}
+        for status in ("green", "amber", "red")
+    }
+    releases = {}
+    for package in packages:
+        counts = statuses.setdefault(
+            package["status"], {"packages": 0, "downloads": 0}
+        )
+        counts["packages"] += 1
+        counts["downloads"] += package["downloads"]
+        data = store.get(package["package_name"]) or {}
+        for release in data.get("pyodide_versions", {}):
+            counts = releases.setdefault(release, {"packages": 0, "downloads": 0})
+            counts["packages"] += 1
+            counts["downloads"] += package["downloads"]
+    for counts in list(statuses.values()) + list(releases.values()):
+        counts["share"] = round(counts["downloads"] / total, 4) if total else 0
+    return {
+        "last_updated": last_updated,
+        "packages": len(packages),
+        "downloads": total,
+        "statuses": statuses,
+        "releases": {
+            release: releases[release]
+            for release in sorted(releases, key=release_key, reverse=True)
+        },
+    }
+
+
+def build_top_packages(store):
+    """
+    Generate top_100_pypi_packages.json, along with the full list of the top
+    --top packages (in pages of TOP_PAGE_SIZE, in /api/top/) and stats.json
+    (in the same directory) aggregating their status and support in each
+    Pyodide release. Returns the list of top packages.
+
+    The download stats are joined against the package data in a single pass,
+    matching names as per PEP 503. Only the summaries of top packages we
+    don't yet know about are fetched from PyPI.
+    """
+    log.info("Generating the top %d PyPI packages...", args.top)
+    response = http_get(args.top_pypi_url)
+    response.raise_for_status()
+    top_pypi_data = response.json()
+
+    last_updated = top_pypi_data.get("last_update", "unknown")
+    rows = top_pypi_data.get("rows", [])[: args.top]
+
+    top_names = [normalize_name(entry.get("project")) for entry in rows]
+
+    # Summaries for top packages we don't yet know about are fetched from
+    # PyPI in one concurrent batch.
+    pypi_metadata = fetch_pypi_metadata(
+        package_name
+        for package_name in top_names
+        if not store.exists(package_name)
+    )
+
+    # Include the Pyodide support status from the package data, if it exists.
+    # Otherwise, default to "amber" status.
+    packages = []
+    for entry, package_name in zip(rows, top_names):
+        downloads = entry.get("download_count", 0)
+        # Check for support data
+        support_data = store.get(package_name)
+        if support_data:
             status = support_data.get("status", "amber")
             desc = support_data.get("summary", "No summary available.")
+        else:
+            status = "amber"
+            pypi_package = pypi_metadata.get(package_name)
+            if pypi_package:
+                desc = pypi_package.get("info", {}).get(
+                    "summary", "No summary available."
+                )
+            else:
+                desc = "No summary available."
+        packages.append(
+            {
+                "package_name": package_name,
+                "downloads": downloads,
+                "status": status,
+                "summary": desc,
+            }
+        )
+
+    # Write out the summary JSON file of the top 100, as used by the home
+    # page (which loads the rest of them from the pages below, if any).
+    summary = {
+        "last_updated": last_updated,
+        "total": len(packages),
+        "packages": packages[:100],
+    }
+    write_output(
+        os.path.join("api", "top_100_pypi_packages.json"),
+        json.dumps(summary, indent=4),
+    )
+
+    # Write out the pages of all the top packages, and their stats.
+    top_dir = os.path.join("api", "top")
+    pages = (len(packages) + TOP_PAGE_SIZE - 1) // TOP_PAGE_SIZE
+    outputs = {}
+    for page in range(1, pages + 1):
+        start = (page - 1) * TOP_PAGE_SIZE
+        outputs[os.path.join(top_dir, f"{page}.json")] = json.dumps(
+            {
+                "last_updated": last_updated,
+                "page": page,
+                "pages": pages,
+                "total": len(packages),
+                "packages": packages[start : start + TOP_PAGE_SIZE],
+            },
+            indent=4,
+        )
+    stats = top_package_stats(packages, store, last_updated)
+    outputs[os.path.join(top_dir, "stats.json")] = json.dumps(stats, indent=4)
+    if not args.dry_run:
+        os.makedirs(top_dir, exist_ok=True)
+        for entry in os.scandir(top_dir):
+            if entry.path not in outputs:
+                # Pages beyond the end of a shorter list.
+                os.remove(entry.path)
+    for filename, content in outputs.items():
+        write_if_changed(filename, content)
+    green = stats["statuses"]["green"]["share"]
+    log.info(
+        "Generated top_100_pypi_packages.json and %d pages of the top %d "
+        "packages (%.0f%% of their downloads are green)",
+        pages,
+        len(packages),
+        green * 100,
+    )
+    return packages
+
+
+def read_top_packages():
+    """
+    Return the list of top packages in the existing pages of them (or
+    top_100_pypi_packages.json), for when the top100 stage isn't run.
+    """
+    packages = []
+    page = 1
+    while True:
+        try:
+            with open(os.path.join("api", "top", f"{page}.json"), "r") as f:
+                top_page = json.load(f)
+        except FileNotFoundError:
+            break
+        count("files_read")
+        packages.extend(top_page["packages"])
+        if page >= top_page["pages"]:
+            break
+        page += 1
+    if packages:
+        return packages
+    try:
+        with open(os.path.join("api", "top_100_pypi_packages.json"), "r") as f:
+            summary = json.load(f)
     except FileNotFoundError:
-        status = "amber"
-        response = requests.get(f"https://pypi.org/pypi/{package_name}/json")
-        if response.status_code == 200:
-            pypi_metadata = response.json()
-            desc = pypi_metadata.get("info", {}).get(
-                "summary", "No summary available."
-            )
+        return []
+    count("files_read")
+    return summary["packages"]
+
+
+#############################################
+# Writing the package files and the last run time.
+#############################################
+
+
+def write_packages(store, community_run, now):
+    """
+    Render the notes of the changed packages to HTML, write out the package
+    files changed by the stages before, and record when the script was last
+    run.
+    """
+    # Render the notes of each package to HTML for the package page. Only
+    # the records changed by this run need it, since the others' notes
+    # haven't changed, unless asked to render them all (which loads every
+    # package file).
+    if markdown:
+        package_names = (
+            store.names() if args.render_notes else sorted(store.dirty)
+        )
+        for package_name in package_names:
+            data = store.get(package_name)
+            notes_html = render_notes(data.get("notes") or "")
+            if data.get("notes_html") != notes_html:
+                data["notes_html"] = notes_html
+                store.put(package_name, data)
+                package_changed(package_name, "notes")
+    else:
+        log.warning(
+            "Install markdown and nh3 to render the notes to HTML. "
+            "The package page will render them in the browser instead."
+        )
+        # Prerendered notes may now be out of date.
+        for package_name in store.dirty:
+            store.get(package_name).pop("notes_html", None)
+
+    # Write out the package files changed by the stages above.
+    store.flush()
+
+    # Record when the script was last run. The browser's cache of the data
+    # files is keyed on this.
+    log.info("Recording last run time: %s", now)
+    write_output(
+        os.path.join("api", "last_run.json"),
+        json.dumps({"last_run": now, "community_updates": community_run}),
+    )
+
+
+#############################################
+# Stage: aggregate.
+# Output all.json and the compact files derived from it.
+#############################################
+
+
+def build_all_json(store):
+    """
+    Generate the all.json file in the API directory containing details of
+    all packages for easy access.
+
+    This is done incrementally: a manifest in the .cache/ directory records
+    the modification time, size and content hash of each package file that
+    went into the current all.json. Only package files that have changed
+    since are re-read and patched into the existing aggregate, so the cost of
+    this step grows with the number of changes, not the size of the
+    catalogue. Records just written by the package store are taken from
+    memory rather than re-read. If all.json itself has changed (or there is
+    no manifest) it is rebuilt from scratch.
+
+    Returns the data of all packages, and the content hash of each of their
+    files.
+    """
+    package_dir = os.path.join("api", "package")
+    all_file = os.path.join("api", "all.json")
+    manifest_file = os.path.join(".cache", "all_manifest.json")
+    try:
+        with open(manifest_file, "r") as f:
+            manifest = json.load(f)
+        stat = os.stat(all_file)
+        if manifest["all_json"] != [stat.st_mtime_ns, stat.st_size]:
+            raise ValueError("all.json has changed since the last build.")
+        with open(all_file, "r") as f:
+            all_packages = json.load(f)
+        count("files_read", 2)
+    except (FileNotFoundError, KeyError, ValueError):
+        log.info("Rebuilding api/all.json from scratch.")
+        manifest = {"files": {}}
+        all_packages = {}
+    files = manifest["files"]
+    changed = False
+    seen = set()
+    for entry in os.scandir(package_dir):
+        if not entry.name.endswith(".json"):
+            continue
+        package_name = entry.name[:-5]
+        seen.add(package_name)
+        stat = entry.stat()
+        known = files.get(entry.name)
+        if package_name in all_packages and known:
+            if (
+                known[:2] == [stat.st_mtime_ns, stat.st_size]
+                and package_name not in store.written
+            ):
+                continue
+        if package_name in store.written:
+            digest = store.written[package_name]
+            record = store.records[package_name]
         else:
-            desc = "No summary available."
-    summary["packages"].append(
+            with open(entry.path, "rb") as f:
+                content = f.read()
+            count("files_read")
+            digest = hashlib.sha256(content).hexdigest()
+            record = None
+        if package_name not in all_packages or not known or known[2] != digest:
+            all_packages[package_name] = record or json.loads(content)
+            changed = True
+        files[entry.name] = [stat.st_mtime_ns, stat.st_size, digest]
+    for package_name in set(all_packages) - seen:
+        # The package file has been removed.
+        del all_packages[package_name]
+        files.pop(f"{package_name}.json", None)
+        changed = True
+    all_packages = {k: all_packages[k] for k in sorted(all_packages)}
+    if not changed and os.path.exists(all_file):
+        log.info("No package changes, api/all.json is up to date.")
+    else:
+        write_output(all_file, json.dumps(all_packages, indent=4))
+        log.info("Generated api/all.json")
+    if not args.dry_run:
+        stat = os.stat(all_file)
+        manifest["all_json"] = [stat.st_mtime_ns, stat.st_size]
+        os.makedirs(".cache", exist_ok=True)
+        atomic_write(manifest_file, json.dumps(manifest))
+    digests = {name[:-5]: entry[2] for name, entry in files.items()}
+    return all_packages, digests
+
+
+def shard_key(package_name):
+    """
+    The name of the shard containing the named package: its first character
+    if that is a letter or digit, otherwise "_".
+    """
+    first = package_name[:1].lower()
+    return first if first.isascii() and first.isalnum() else "_"
+
+
+def build_compact_outputs(all_packages):
+    """
+    Generate the compact, browser friendly versions of all.json: a minified
+    index.json and minified per-shard files of the full data. Returns a dict
+    of the filenames and minified content of the API files written.
+    """
+    index = {
+        "fields": ["status", "summary", "pyodide_version"],
+        "packages": {},
+    }
+    shards = {}
+    for package_name, data in all_packages.items():
+        pyodide_versions = data.get("pyodide_versions") or {}
+        latest = max(pyodide_versions, key=release_key, default=None)
+        index["packages"][package_name] = [
+            data.get("status", "amber"),
+            data.get("summary") or "",
+            latest,
+        ]
+        shards.setdefault(shard_key(package_name), {})[package_name] = data
+    outputs = {os.path.join("api", "index.json"): minified(index)}
+    shard_dir = os.path.join("api", "shard")
+    if not args.dry_run:
+        os.makedirs(shard_dir, exist_ok=True)
+    for key, packages in shards.items():
+        outputs[os.path.join(shard_dir, f"{key}.json")] = minified(packages)
+    if os.path.isdir(shard_dir) and not args.dry_run:
+        for entry in os.scandir(shard_dir):
+            shard_file = entry.path.removesuffix(".gz").removesuffix(".br")
+            if shard_file not in outputs:
+                # Shards for which there are no longer any packages.
+                os.remove(entry.path)
+    for filename, content in outputs.items():
+        write_api_file(filename, content)
+    log.info("Generated api/index.json and %d shards in api/shard/", len(shards))
+    return outputs
+
+
+def name_trigrams(key):
+    """
+    The set of trigrams in a normalized package name, ignoring separators.
+
+    This must match the implementation in home.py, which uses the trigrams to
+    find fuzzy matches for what the user has typed.
+    """
+    compact = key.replace("-", "")
+    if len(compact) < 3:
+        return {compact} if compact else set()
+    return {compact[i : i + 3] for i in range(len(compact) - 2)}
+
+
+def build_search_index(all_packages, top_packages):
+    """
+    Generate the search.json index of all known package names used for the
+    as-you-type suggestions on the home page.
+
+    The packages are a list of [normalized name, name, status] entries,
+    sorted by normalized name so prefix matches can be found with a binary
+    search. The trigrams map each trigram to the positions of the packages
+    whose (separator-less) normalized name contains it.
+    """
+    entries = {}
+    for package_name, data in all_packages.items():
+        entries[normalize_name(package_name)] = [
+            package_name,
+            data.get("status", "amber"),
+        ]
+    for package in top_packages:
+        entries.setdefault(
+            normalize_name(package["package_name"]),
+            [package["package_name"], package["status"]],
+        )
+    keys = sorted(entries)
+    trigrams = {}
+    for position, key in enumerate(keys):
+        for trigram in sorted(name_trigrams(key)):
+            trigrams.setdefault(trigram, []).append(position)
+    index = {
+        "packages": [[key, *entries[key]] for key in keys],
+        "trigrams": trigrams,
+    }
+    filename = os.path.join("api", "search.json")
+    content = minified(index)
+    write_api_file(filename, content)
+    log.info("Generated api/search.json with %d package names", len(keys))
+    return {filename: content}
+
+
+def build_support_matrix(all_packages):
+    """
+    Generate the support matrix: a dense package × Pyodide release grid,
+    for answering questions about many packages at once without parsing
+    all.json.
+
+    The grid is in matrix.npy (a NumPy array file, which can be memory
+    mapped) with a row per package and a column per release, oldest first.
+    Each cell is 0 if the release doesn't support the package, otherwise 1 +
+    the position in the versions list of the package version it includes.
+    The package names (sorted), statuses, releases and versions are in
+    matrix.json.
+
+    The same data, keyed by PEP 503 normalized package name, goes in
+    lookup.json for check_requirements.py (see build_lookup_index). Returns
+    a dict of the filenames and content written.
+    """
+    index = ReleaseIndex(
         {
-            "package_name": package_name,
-            "downloads": downloads,
-            "status": status,
-            "summary": desc,
+            release
+            for data in all_packages.values()
+            for release in data.get("pyodide_versions") or {}
         }
     )
+    package_names = sorted(all_packages)
+    versions = {}
+    width = len(index.releases)
+    grid = array("I", [0]) * (len(package_names) * width)
+    for row, package_name in enumerate(package_names):
+        data = all_packages[package_name]
+        pyodide_versions = data.get("pyodide_versions") or {}
+        for release, support in pyodide_versions.items():
+            version = support.get("package_version")
+            if version not in versions:
+                versions[version] = len(versions) + 1
+            grid[row * width + index.ordinals[release]] = versions[version]
+    if len(versions) < 65535:
+        # Unsigned 16 bit cells are plenty.
+        grid = array("H", grid)
+    header = {
+        "data": "matrix.npy",
+        "shape": [len(package_names), width],
+        "packages": package_names,
+        "statuses": [
+            all_packages[package_name].get("status", "amber")
+            for package_name in package_names
+        ],
+        "releases": index.releases,
+        "pyscript_versions": index.pyscript_versions,
+        "versions": list(versions),
+    }
+    outputs = {
+        os.path.join("api", "matrix.json"): minified(header),
+        os.path.join("api", "matrix.npy"): npy_file(
+            grid, (len(package_names), width)
+        ),
+    }
+    outputs.update(build_lookup_index(header, grid))
+    for filename, content in outputs.items():
+        write_if_changed(filename, content)
+    log.info(
+        "Generated api/matrix.json, api/matrix.npy and api/lookup.json "
+        "(%d packages × %d releases)",
+        len(package_names),
+        width,
+    )
+    return outputs
+
+
+def build_lookup_index(header, grid):
+    """
+    Return the content of lookup.json, the index used to check whole lists
+    of requirements at once.
+
+    Its packages map each normalized package name to a [name, status,
+    cells] entry, where the cells are the package's row of the support
+    matrix (or an empty list if Pyodide has never included it). Where
+    several names normalize to the same one, the one Pyodide includes in
+    the most releases wins.
+    """
+    width = len(header["releases"])
+    packages = {}
+    for row, package_name in enumerate(header["packages"]):
+        cells = list(grid[row * width : (row + 1) * width])
+        if not any(cells):
+            cells = []
+        key = normalize_name(package_name)
+        if key in packages:
+            supported = sum(1 for cell in packages[key][2] if cell)
+            if sum(1 for cell in cells if cell) <= supported:
+                continue
+        packages[key] = [package_name, header["statuses"][row], cells]
+    lookup = {
+        "releases": header["releases"],
+        "pyscript_versions": header["pyscript_versions"],
+        "versions": header["versions"],
+        "packages": {key: packages[key] for key in sorted(packages)},
+    }
+    return {os.path.join("api", "lookup.json"): minified(lookup)}
+
+
+def build_size_report(outputs, now):
+    """
+    Record the raw and compressed size of the API payloads in sizes.json, so
+    we can keep track of how heavy they are from one release to the next.
+
+    The outputs map each filename to its content, or to None for files to
+    be read from disk. sizes.json is only rewritten (with the last_run of
+    this build) when the sizes have changed.
+    """
+    report = {"last_run": now, "files": {}}
+    for filename in sorted(outputs):
+        content = outputs[filename]
+        if content is None:
+            try:
+                with open(filename, "rb") as f:
+                    content = f.read()
+            except FileNotFoundError:
+                continue
+            count("files_read")
+        elif isinstance(content, str):
+            content = content.encode("utf-8")
+        sizes = {"bytes": len(content), "gzip": len(gzip.compress(content))}
+        if brotli:
+            sizes["brotli"] = len(brotli.compress(content))
+        name = os.path.relpath(filename, "api").replace(os.sep, "/")
+        report["files"][name] = sizes
+    sizes_file = os.path.join("api", "sizes.json")
+    try:
+        with open(sizes_file, "r") as f:
+            previous = json.load(f)
+        count("files_read")
+    except (FileNotFoundError, json.JSONDecodeError):
+        previous = {}
+    if previous.get("files") != report["files"]:
+        write_output(sizes_file, json.dumps(report, indent=4))
+    log.info("Payload sizes (bytes / gzip):")
+    for name, sizes in report["files"].items():
+        if not name.startswith("shard/"):
+            log.info("  %s: %d / %d", name, sizes["bytes"], sizes["gzip"])
+    shard_sizes = [
+        sizes for name, sizes in report["files"].items()
+        if name.startswith("shard/")
+    ]
+    if shard_sizes:
+        largest = max(shard_sizes, key=lambda sizes: sizes["bytes"])
+        log.info(
+            "  %d shards, largest: %d / %d",
+            len(shard_sizes),
+            largest["bytes"],
+            largest["gzip"],
+        )
+
+
+# The site files the service worker (sw.js) caches as soon as it's installed,
+# relative to the site root.
+PRECACHE = [
+    "./",
+    "styles.css",
+    "fetch_cache.py",
+    "home.py",
+    "package/",
+    "package/main.py",
+    "api/top_100_pypi_packages.json",
+    "api/search.json",
+]
+
+
+def content_hash(content):
+    """
+    Return a short hash of the (str or bytes) content, for cache busting.
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return hashlib.sha256(content).hexdigest()[:16]
+
+
+def build_precache_manifest(outputs, package_digests, pages, now):
+    """
+    Generate the precache.json manifest the service worker (sw.js) uses to
+    decide what to cache, and when to fetch it again:
+
+    {
+        "version": The last_run time of this build,
+        "precache": The site files to cache as soon as it's installed,
+        "runtime": The files of the pinned PyScript release to cache too,
+        "files": {
+            "api/package/numpy.json": A hash of the file's content,
+            ...
+        }
+    }
+
+    Every data file and prerendered page is listed in files, so the service
+    worker can cache each by its hash and only fetch it again once it has
+    changed. The outputs (as passed to build_size_report) and pages map
+    filenames to their content, while the package files are listed by the
+    hashes recorded when building all.json. all.json itself is left out, as
+    the site never loads it.
+    """
+    files = {}
+    for filename, content in list(outputs.items()) + list(pages.items()):
+        if filename == os.path.join("api", "all.json"):
+            continue
+        if content is None:
+            try:
+                with open(filename, "rb") as f:
+                    content = f.read()
+            except FileNotFoundError:
+                continue
+            count("files_read")
+        files[filename.replace(os.sep, "/")] = content_hash(content)
+    for package_name, digest in package_digests.items():
+        files[f"api/package/{package_name}.json"] = digest[:16]
+    try:
+        with open(HOME_PAGE, "r") as f:
+            home_page = f.read()
+        count("files_read")
+    except FileNotFoundError:
+        home_page = ""
+    runtime = re.findall(r'"(https://pyscript\.net/releases/[^"]+)"', home_page)
+    manifest = {
+        "version": now,
+        "precache": PRECACHE,
+        "runtime": runtime,
+        "files": {name: files[name] for name in sorted(files)},
+    }
+    write_if_changed(os.path.join("api", "precache.json"), minified(manifest))
+    log.info("Generated api/precache.json listing %d files", len(files))
+
+
+def build_aggregates(store, top_packages, now):
+    """
+    Generate all.json, the compact files derived from it, the search index,
+    the prerendered pages, the report of the sizes of the API files and the
+    service worker's precache manifest.
+    """
+    all_packages, package_digests = build_all_json(store)
+    outputs = {
+        os.path.join("api", "all.json"): None,
+        os.path.join("api", "top_100_pypi_packages.json"): None,
+        os.path.join("api", "changes.json"): None,
+    }
+    top_dir = os.path.join("api", "top")
+    if os.path.isdir(top_dir):
+        # The pages of top packages, which the home page loads as needed.
+        for entry in sorted(os.scandir(top_dir), key=lambda entry: entry.name):
+            outputs[entry.path] = None
+    outputs.update(build_compact_outputs(all_packages))
+    outputs.update(build_search_index(all_packages, top_packages))
+    outputs.update(build_support_matrix(all_packages))
+    pages = build_static_pages(all_packages, top_packages)
+    build_size_report(outputs, now)
+    build_precache_manifest(outputs, package_digests, pages, now)
 
-# Write out the summary JSON file
-with open(os.path.join("api", "top_100_pypi_packages.json"), "w") as f:
-    json.dump(summary, f, indent=4)
-print("Generated top_100_pypi_packages.json")
 
 #############################################
-# Step 4: Record last run time and output all.json
+# Putting it all together.
 #############################################
 
-# Record when the script was last run.
-with open(os.path.join("api", "last_run.json"), "w") as f:
+
+def configure(argv=None):
+    """
+    Parse and check the command line arguments, and set up the logging and
+    the output as they ask. Returns the parsed arguments.
+    """
+    global args
+    args = parser.parse_args(argv)
+    args.stages = [
+        stage.strip() for stage in args.stage.split(",") if stage.strip()
+    ]
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(sorted(unknown))}")
+    if args.verbose and args.quiet:
+        parser.error("--verbose and --quiet can't be used together")
+    setup_logging(args)
+    setup_output(args)
+    return args
+
+
+def main(argv=None):
+    """
+    Run the selected stages of the build, in order. Whichever stages run,
+    the changed package files and the last run time are written out before
+    the aggregate stage, which reads them back.
+    """
+    configure(argv)
+    stages = args.stages
+    start = time.perf_counter()
+    started_at = datetime.datetime.now(tz=datetime.timezone.utc).isoformat()
+    setup_http(args)
+    store = PackageStore(os.path.join("api", "package"))
+    last_run_data = read_last_run()
+
+    # Carried over as it was if the community stage isn't run.
+    community_run = community_run_record(last_run_data)
+    if "community" in stages:
+        community_run = run_stage(
+            "community", update_from_community, store, last_run_data
+        )
+    if "pyodide" in stages:
+        run_stage("pyodide", update_from_pyodide, store)
+    top_packages = None
+    if "top100" in stages:
+        top_packages = run_stage("top100", build_top_packages, store)
+    if args.refresh_pypi:
+        run_stage("pypi", refresh_pypi, store)
     now = datetime.datetime.now(tz=datetime.timezone.utc).isoformat()
-    print(f"Recording last run time: {now}")
-    json.dump({"last_run": now}, f)
-
-
-# Generate a final all.json file in the API directory containing details of
-# all packages for easy access.
-all_packages = {}
-for filename in os.listdir(os.path.join("api", "package")):
-    if filename.endswith(".json"):
-        package_name = filename[:-5]
-        with open(os.path.join("api", "package", filename), "r") as f:
-            data = json.load(f)
-        all_packages[package_name] = data
-with open(os.path.join("api", "all.json"), "w") as f:
-    json.dump(all_packages, f, indent=4)
-print("Generated api/all.json")
+    run_stage("write", write_packages, store, community_run, now)
+    if "aggregate" in stages:
+        if top_packages is None:
+            top_packages = read_top_packages()
+        run_stage("aggregate", build_aggregates, store, top_packages, now)
+
+    # Keep the HTTP cache within its size limit.
+    build_http.http_cache.evict()
+
+    report = {
+        "started_at": started_at,
+        "stages_run": stages,
+        "dry_run": args.dry_run,
+        "offline": args.offline,
+        "wall_time": round(time.perf_counter() - start, 3),
+        "stages": stats,
+        "totals": {
+            counter: sum(counters[counter] for counters in stats.values())
+            for counter in new_counters()
+            if counter != "wall_time"
+        },
+        "warnings": warnings_logged,
+        "changed_packages": {
+            package_name: package_changes[package_name]
+            for package_name in sorted(package_changes)
+        },
+    }
+    print_summary(report)
+    if args.report:
+        atomic_write(args.report, json.dumps(report, indent=4))
+        log.info("Wrote the build report to %s", args.report)
+    close_events(
+        wall_time=report["wall_time"],
+        totals=report["totals"],
+        warnings=len(warnings_logged),
+        changed_packages=len(package_changes),
+    )
+    return report
+
+
+if __name__ == "__main__":
+    main()
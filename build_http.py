@@ -0,0 +1,355 @@
+"""
+The HTTP layer of the data build (build_data.py).
+
+All requests go through one pooled session (see setup_http), with retries
+and exponential backoff on transient failures and a per-host rate limit, so
+the PyPI metadata can be fetched concurrently without hammering PyPI.
+
+All upstream responses are cached in the .cache/ directory (see HTTPCache)
+and revalidated with conditional requests (ETag / Last-Modified), so a run
+where nothing has changed upstream costs next to no traffic. In offline mode
+only the cache is used.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from build_log import Progress, count, log
+from build_output import atomic_write
+
+
+# Seconds to wait before the first retry of a failed request. This doubles
+# with each subsequent retry.
+RETRY_BACKOFF = 0.5
+# Status codes worth retrying, since they're usually transient.
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """
+    Spaces out requests to the same host so that no more than `rate` of them
+    start per second, however many threads are fetching at once.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self.lock = threading.Lock()
+        self.next_slot = {}
+
+    def wait(self, host):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def downloaded(chunks):
+    """
+    Pass through the chunks of a response body, counting the bytes.
+    """
+    for chunk in chunks:
+        count("bytes_downloaded", len(chunk))
+        yield chunk
+
+
+class HTTPCache:
+    """
+    A persistent on-disk cache of HTTP responses, keyed by URL.
+
+    Each entry is a body file and a small JSON file of metadata (status code,
+    validators and when it was fetched). Entries younger than `ttl` seconds
+    are served as-is, older ones are revalidated with a conditional request.
+    The least recently used entries are evicted once the cache grows beyond
+    `max_size` bytes.
+    """
+
+    def __init__(self, path, ttl, max_size):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        os.makedirs(path, exist_ok=True)
+
+    def paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.path, key)
+        return base + ".body", base + ".json"
+
+    def get(self, url):
+        """
+        Return the metadata for the cached response to the URL, or None.
+        """
+        body_file, meta_file = self.paths(url)
+        try:
+            with open(meta_file, "r") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if not os.path.exists(body_file):
+            return None
+        return meta
+
+    def is_fresh(self, meta):
+        return time.time() - meta["fetched_at"] < self.ttl
+
+    def validators(self, meta):
+        """
+        Return the conditional request headers for the cached response.
+        """
+        headers = {}
+        if meta and meta["status"] == 200:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def response(self, url, meta, stream=False):
+        """
+        Build a response object from the cached entry for the URL. Touching
+        the body file marks the entry as recently used for eviction. When
+        streaming, the body is left in the cache for the caller to read.
+        """
+        body_file, _ = self.paths(url)
+        os.utime(body_file)
+        response = requests.Response()
+        response.url = url
+        response.status_code = meta["status"]
+        response.encoding = meta.get("encoding") or "utf-8"
+        if not stream:
+            with open(body_file, "rb") as f:
+                response._content = f.read()
+            count("files_read")
+        return response
+
+    def store(self, url, response):
+        body_file, meta_file = self.paths(url)
+        meta = {
+            "url": url,
+            "status": response.status_code,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "encoding": response.encoding,
+            "fetched_at": time.time(),
+        }
+        # Chunked, so streamed responses are never held in memory in full.
+        atomic_write(
+            body_file, downloaded(response.iter_content(chunk_size=64 * 1024))
+        )
+        atomic_write(meta_file, json.dumps(meta))
+
+    def refresh(self, url, meta, response):
+        """
+        Record that the cached entry for the URL was revalidated (i.e. the
+        server replied with 304 Not Modified).
+        """
+        _, meta_file = self.paths(url)
+        meta["fetched_at"] = time.time()
+        meta["etag"] = response.headers.get("ETag", meta.get("etag"))
+        atomic_write(meta_file, json.dumps(meta))
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits within
+        its maximum size.
+        """
+        entries = []
+        total = 0
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(".body"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        entries.sort()
+        evicted = 0
+        for _, size, body_file in entries:
+            if total <= self.max_size:
+                break
+            os.remove(body_file)
+            meta_file = body_file[: -len(".body")] + ".json"
+            if os.path.exists(meta_file):
+                os.remove(meta_file)
+            total -= size
+            evicted += 1
+        if evicted:
+            log.info("Evicted %d entries from the HTTP cache.", evicted)
+
+
+# The shared session, rate limiter and HTTP cache, and the settings for the
+# requests made (see setup_http).
+session = None
+rate_limiter = None
+http_cache = None
+offline = False
+retries = 3
+concurrency = 16
+pypi_url = "https://pypi.org/pypi"
+
+
+def setup_http(options):
+    """
+    Set up the shared session, rate limiter and HTTP cache as per the parsed
+    command line options.
+    """
+    global session, rate_limiter, http_cache, offline, retries, concurrency
+    global pypi_url
+    offline = options.offline
+    retries = options.retries
+    concurrency = max(options.concurrency, 1)
+    pypi_url = options.pypi_url
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    rate_limiter = RateLimiter(options.rate_limit)
+    http_cache = HTTPCache(
+        ".cache", options.cache_ttl, int(options.cache_size * 1024**2)
+    )
+
+
+def http_get(url, stream=False, revalidate=False):
+    """
+    GET the given URL via the shared session, honouring the per-host rate
+    limit and retrying (with exponential backoff) on connection errors and
+    transient error responses.
+
+    Responses are served from the HTTP cache while fresh, and revalidated
+    with a conditional request once stale (or always, if asked to
+    revalidate). In offline mode only the cache is used, and uncached URLs
+    raise a ConnectionError.
+
+    When streaming, the body of a successful response is streamed into the
+    cache but not returned (use http_open to read it).
+    """
+    meta = http_cache.get(url)
+    if meta and (
+        offline or (http_cache.is_fresh(meta) and not revalidate)
+    ):
+        count("http_cache_hits")
+        return http_cache.response(url, meta, stream)
+    if offline:
+        raise requests.ConnectionError(f"Offline and {url} is not cached.")
+    headers = http_cache.validators(meta)
+    host = urlsplit(url).netloc
+    for attempt in range(retries + 1):
+        rate_limiter.wait(host)
+        count("http_requests")
+        try:
+            response = session.get(
+                url, headers=headers, timeout=30, stream=stream
+            )
+        except (requests.ConnectionError, requests.Timeout) as error:
+            if attempt == retries:
+                raise
+            log.debug("Retrying %s after %s", url, error)
+        else:
+            if (
+                response.status_code not in RETRY_STATUS_CODES
+                or attempt == retries
+            ):
+                break
+            log.debug("Retrying %s after a %d", url, response.status_code)
+        time.sleep(RETRY_BACKOFF * 2**attempt)
+    if response.status_code == 304 and meta:
+        http_cache.refresh(url, meta, response)
+        return http_cache.response(url, meta, stream)
+    if response.status_code in {200, 404}:
+        # Unknown packages are cached too, so they're not re-requested from
+        # PyPI on every run.
+        http_cache.store(url, response)
+    return response
+
+
+def http_open(url, revalidate=False):
+    """
+    Return the body of a successful response from the URL as a file opened
+    in binary mode. The body is streamed into (and read back from) the HTTP
+    cache, so large documents are never held in memory in full.
+    """
+    response = http_get(url, stream=True, revalidate=revalidate)
+    response.raise_for_status()
+    body_file, _ = http_cache.paths(url)
+    count("files_read")
+    return open(body_file, "rb")
+
+
+def fetch_pypi_package(package_name):
+    """
+    Return the PyPI JSON metadata for the named package, or None if it
+    could not be fetched.
+    """
+    try:
+        response = http_get(f"{pypi_url}/{package_name}/json")
+    except requests.RequestException:
+        return None
+    if response.status_code == 200:
+        return response.json()
+    return None
+
+
+def pypi_subset(pypi_package):
+    """
+    Extract the subset of a package's PyPI JSON metadata shown on the
+    package page.
+    """
+    info = pypi_package.get("info") or {}
+    author = info.get("author")
+    if not author and info.get("author_email"):
+        # Usually of the form "Some Name <some@email.address>".
+        author = info["author_email"].split("<")[0].strip(' ",')
+    project_urls = info.get("project_urls") or {}
+    home_page = info.get("home_page") or next(
+        (
+            project_urls[key]
+            for key in ("Homepage", "Home", "homepage", "Source", "Repository")
+            if project_urls.get(key)
+        ),
+        None,
+    )
+    wheels = [
+        file["filename"]
+        for file in pypi_package.get("urls") or []
+        if file.get("packagetype") == "bdist_wheel"
+    ]
+    return {
+        "author": author or None,
+        "summary": info.get("summary") or None,
+        "home_page": home_page,
+        "latest_version": info.get("version"),
+        "requires_python": info.get("requires_python") or None,
+        "has_pure_python_wheel": any(
+            wheel.endswith("-none-any.whl") for wheel in wheels
+        ),
+        "has_wasm_wheel": any(
+            "emscripten" in wheel or "pyodide" in wheel or "wasm32" in wheel
+            for wheel in wheels
+        ),
+    }
+
+
+def fetch_pypi_metadata(package_names):
+    """
+    Concurrently fetch PyPI metadata for all the named packages. Returns a
+    dict mapping each package name to its metadata (or None on failure).
+    """
+    package_names = sorted(set(package_names))
+    if not package_names:
+        return {}
+    log.info("Fetching PyPI metadata for %d packages...", len(package_names))
+    results = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        with Progress("Fetching PyPI metadata", len(package_names)) as progress:
+            for package_name, result in zip(
+                package_names, pool.map(fetch_pypi_package, package_names)
+            ):
+                results[package_name] = result
+                progress.update()
+    return results
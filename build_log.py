@@ -0,0 +1,290 @@
+"""
+The logging and instrumentation of the data build (build_data.py).
+
+Each stage of the build is run via run_stage, which times it and attributes
+the HTTP traffic and file I/O counted (via count) meanwhile to it. Progress
+is logged to stderr via `log`, with a compact progress indicator (Progress)
+for the long loops, and the warnings and changed packages are recorded for
+the summary printed at the end of the run (print_summary) and for the
+optional JSON lines event stream.
+"""
+import datetime
+import json
+import logging
+import sys
+import threading
+import time
+
+
+#############################################
+# Instrumentation.
+#############################################
+
+
+# Counters (wall time, HTTP traffic and file I/O) for each stage that has
+# run, by stage name. Setup work done before the first stage is counted
+# under "setup".
+stats = {}
+stats_lock = threading.Lock()
+current_stage = "setup"
+
+
+def new_counters():
+    return {
+        "wall_time": 0.0,
+        "http_requests": 0,
+        "http_cache_hits": 0,
+        "bytes_downloaded": 0,
+        "files_read": 0,
+        "files_written": 0,
+        "files_not_written": 0,
+    }
+
+
+def count(counter, amount=1):
+    """
+    Add the amount to the named counter of the running stage. Safe to call
+    from the threads fetching from PyPI.
+    """
+    with stats_lock:
+        counters = stats.setdefault(current_stage, new_counters())
+        counters[counter] += amount
+
+
+def run_stage(name, function, *arguments):
+    """
+    Run one stage of the build, timing it and attributing the HTTP traffic
+    and file I/O done meanwhile to it. Returns the stage's result.
+    """
+    global current_stage
+    log.info("Stage: %s", name)
+    current_stage = name
+    stats[name] = new_counters()
+    emit_event("stage_start")
+    start = time.perf_counter()
+    try:
+        return function(*arguments)
+    finally:
+        stats[name]["wall_time"] = round(time.perf_counter() - start, 3)
+        emit_event("stage_end", counters=stats[name])
+        current_stage = "setup"
+
+
+#############################################
+# Logging.
+#############################################
+
+# The build's log. The detail of each package processed is logged at DEBUG
+# (shown with -v), the progress of each stage at INFO (the default) and
+# anything that needs a look before the changes are reviewed at WARNING
+# (all that's shown with -q). Use %-style arguments rather than f-strings
+# for DEBUG messages, so they cost next to nothing when not shown.
+log = logging.getLogger("build_data")
+
+# The messages of the warnings logged this run, for the summary.
+warnings_logged = []
+# The packages changed this run, mapped to the reasons why, for the summary.
+package_changes = {}
+
+# The JSON lines file of events (see --events), if there is one.
+events_file = None
+events_lock = threading.Lock()
+
+# Seconds between redraws of a progress indicator.
+PROGRESS_INTERVAL = 0.1
+# The most warnings (and changed packages for each reason) listed in the
+# summary. All of them are in the report and the event stream.
+SUMMARY_LIMIT = 20
+
+
+def emit_event(event, **fields):
+    """
+    Write the event, stamped with the time and the running stage, to the
+    JSON lines event stream (if there is one). Safe to call from the threads
+    fetching from PyPI.
+    """
+    if events_file is None:
+        return
+    line = json.dumps(
+        {
+            "time": datetime.datetime.now(tz=datetime.timezone.utc).isoformat(),
+            "stage": current_stage,
+            "event": event,
+            **fields,
+        }
+    )
+    with events_lock:
+        events_file.write(line + "\n")
+
+
+def package_changed(package_name, reason, **details):
+    """
+    Record that the named package was changed by this run, and why (e.g.
+    "pyodide" or "community"), along with any details for the event stream.
+    """
+    package_changes.setdefault(package_name, []).append(reason)
+    log.debug("Changed package '%s' (%s)", package_name, reason)
+    emit_event("package_changed", package=package_name, reason=reason, **details)
+
+
+class Progress:
+    """
+    A compact progress indicator for the long loops of the build: a single
+    line (e.g. "Processing packages: 1200/3400") redrawn in place on stderr
+    at most every PROGRESS_INTERVAL seconds, and cleared when done.
+
+    It's only shown on a terminal, at the default verbosity: with -v the
+    detail is logged instead, and with -q nothing is.
+    """
+
+    # The progress indicator currently shown, if any.
+    active = None
+
+    def __init__(self, label, total):
+        self.label = label
+        self.total = total
+        self.done = 0
+        self.next_draw = 0
+        self.shown = (
+            log.getEffectiveLevel() == logging.INFO and sys.stderr.isatty()
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if Progress.active is self:
+            Progress.clear()
+
+    def update(self, amount=1):
+        self.done += amount
+        if not self.shown:
+            return
+        now = time.monotonic()
+        if now >= self.next_draw or self.done == self.total:
+            self.next_draw = now + PROGRESS_INTERVAL
+            Progress.active = self
+            sys.stderr.write(f"\r\x1b[K{self.label}: {self.done}/{self.total}")
+            sys.stderr.flush()
+
+    @staticmethod
+    def clear():
+        """
+        Clear the line of the progress indicator currently shown, if any.
+        """
+        if Progress.active:
+            sys.stderr.write("\r\x1b[K")
+            sys.stderr.flush()
+            Progress.active = None
+
+
+class ConsoleHandler(logging.StreamHandler):
+    """
+    Logs to stderr, clearing any progress indicator out of the way first.
+    Warnings are prefixed with "Warning:".
+    """
+
+    def emit(self, record):
+        Progress.clear()
+        super().emit(record)
+
+    def format(self, record):
+        message = super().format(record)
+        if record.levelno >= logging.WARNING:
+            return f"{record.levelname.capitalize()}: {message}"
+        return message
+
+
+class EventHandler(logging.Handler):
+    """
+    Records the warnings logged, for the summary at the end of the run, and
+    passes them on to the event stream. Log them with extra={"package": ...}
+    to record which package they're about.
+    """
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+
+    def emit(self, record):
+        message = record.getMessage()
+        warnings_logged.append(message)
+        fields = {}
+        if hasattr(record, "package"):
+            fields["package"] = record.package
+        emit_event("warning", message=message, **fields)
+
+
+def setup_logging(options):
+    """
+    Set up the log at the verbosity asked for by the parsed command line
+    options (--verbose, --quiet and --events), open the event stream, and
+    clear the counters and records of any previous run.
+    """
+    global current_stage, events_file
+    log.handlers.clear()
+    log.propagate = False
+    if options.verbose:
+        log.setLevel(logging.DEBUG)
+    elif options.quiet:
+        log.setLevel(logging.WARNING)
+    else:
+        log.setLevel(logging.INFO)
+    log.addHandler(ConsoleHandler())
+    log.addHandler(EventHandler())
+    stats.clear()
+    current_stage = "setup"
+    warnings_logged.clear()
+    package_changes.clear()
+    if options.events:
+        events_file = open(options.events, "w", encoding="utf-8")
+
+
+def close_events(**fields):
+    """
+    Write the summary event, with the given fields, and close the event
+    stream (if there is one).
+    """
+    global events_file
+    if events_file:
+        emit_event("summary", **fields)
+        events_file.close()
+        events_file = None
+
+
+def print_summary(report):
+    """
+    Print the summary of the run: the time and I/O of each stage, the
+    warnings, and which packages changed (and why), for reviewing the
+    changes before they're pushed. This is printed whatever the verbosity.
+    """
+    print("Stage timings:")
+    for name, counters in report["stages"].items():
+        print(
+            f"  {name}: {counters['wall_time']:.2f}s, "
+            f"{counters['http_requests']} requests "
+            f"({counters['http_cache_hits']} from cache), "
+            f"{counters['bytes_downloaded']} bytes downloaded, "
+            f"{counters['files_read']} files read, "
+            f"{counters['files_written']} written"
+        )
+    if report["dry_run"]:
+        print(
+            f"Dry run: {report['totals']['files_not_written']} data files "
+            "were not written."
+        )
+    warnings = report["warnings"]
+    print(f"{len(warnings)} warnings.")
+    for message in warnings[:SUMMARY_LIMIT]:
+        print(f"  {message}")
+    if len(warnings) > SUMMARY_LIMIT:
+        print(f"  ... and {len(warnings) - SUMMARY_LIMIT} more.")
+    by_reason = {}
+    for package_name, reasons in report["changed_packages"].items():
+        for reason in sorted(set(reasons)):
+            by_reason.setdefault(reason, []).append(package_name)
+    print(f"{len(report['changed_packages'])} packages changed.")
+    for reason, package_names in sorted(by_reason.items()):
+        listed = ", ".join(package_names[:SUMMARY_LIMIT])
+        if len(package_names) > SUMMARY_LIMIT:
+            listed += f" and {len(package_names) - SUMMARY_LIMIT} more"
+        print(f"  {reason} ({len(package_names)}): {listed}")
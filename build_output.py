@@ -0,0 +1,141 @@
+"""
+Writing the data files generated by the build (build_data.py).
+
+Every file is written atomically, via a temporary file in the same
+directory, so an interrupted run never leaves a half-written file behind.
+Files whose content hasn't changed are left alone (so their modification
+times, and the HTTP caches keyed on them, are kept), and in a dry run none
+of the data files are written at all.
+"""
+import gzip
+import json
+import os
+import sys
+import tempfile
+from array import array
+
+from build_log import count
+
+try:
+    # Optional: only needed to pre-compress the API files with Brotli.
+    import brotli
+except ImportError:
+    brotli = None
+
+# Whether this is a dry run, in which the data files aren't written, and
+# whether to also write pre-compressed copies of the compact API files (see
+# setup_output).
+dry_run = False
+compress = False
+
+
+def setup_output(options):
+    """
+    Set up the output as per the parsed command line options (--dry-run and
+    --compress).
+    """
+    global dry_run, compress
+    dry_run = options.dry_run
+    compress = options.compress
+
+
+# The permissions of the files written, as open() would give them (mkstemp
+# only makes its temporary files readable by their owner).
+UMASK = os.umask(0o022)
+os.umask(UMASK)
+FILE_MODE = 0o666 & ~UMASK
+
+
+def atomic_write(filename, content):
+    """
+    Write content (str, bytes or an iterable of bytes chunks) to the named
+    file via a temporary file in the same directory, so an interrupted run
+    never leaves a half-written file behind.
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    if isinstance(content, bytes):
+        content = [content]
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(filename) or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in content:
+                f.write(chunk)
+        os.chmod(tmp, FILE_MODE)
+        os.replace(tmp, filename)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    count("files_written")
+
+
+def write_output(filename, content):
+    """
+    Atomically write one of the data files this script generates, unless
+    this is a dry run.
+    """
+    if dry_run:
+        count("files_not_written")
+        return
+    atomic_write(filename, content)
+
+
+def write_if_changed(filename, content):
+    """
+    Atomically write content to the named file, unless it already holds
+    exactly that content. Returns True if the file was (or, in a dry run,
+    would have been) written.
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    try:
+        with open(filename, "rb") as f:
+            count("files_read")
+            if f.read() == content:
+                return False
+    except FileNotFoundError:
+        pass
+    write_output(filename, content)
+    return True
+
+
+def minified(data):
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def write_api_file(filename, content):
+    """
+    Write a compact API file, along with pre-compressed copies of it if the
+    --compress flag was given.
+    """
+    write_if_changed(filename, content)
+    if compress:
+        content = content.encode("utf-8")
+        write_if_changed(filename + ".gz", gzip.compress(content, mtime=0))
+        if brotli:
+            write_if_changed(filename + ".br", brotli.compress(content))
+
+
+def npy_file(grid, shape):
+    """
+    Return the content of a NumPy .npy (format version 1.0) file holding the
+    given array of unsigned integers, with the given 2D shape.
+    """
+    dtype = {"H": "<u2", "I": "<u4"}[grid.typecode]
+    header = (
+        f"{{'descr': '{dtype}', 'fortran_order': False, "
+        f"'shape': ({shape[0]}, {shape[1]}), }}"
+    )
+    # The magic string, version, header length and header are padded to a
+    # multiple of 64 bytes, ending with a newline.
+    padding = 64 - (10 + len(header) + 1) % 64
+    header = header + " " * padding + "\n"
+    if sys.byteorder == "big":
+        grid = array(grid.typecode, grid)
+        grid.byteswap()
+    return (
+        b"\x93NUMPY\x01\x00"
+        + len(header).to_bytes(2, "little")
+        + header.encode("latin-1")
+        + grid.tobytes()
+    )
@@ -0,0 +1,141 @@
+"""
+A MicroPython based script for checking a whole list of requirements at once.
+
+It does three things:
+
+1. Loads the prebuilt name index (/api/lookup.json) once, via the
+   browser-side cache in fetch_cache.py.
+2. When a requirements.txt or pyproject.toml file is pasted in (or chosen),
+   parses it and checks every requirement against the index in one go,
+   using check_requirements.py (the same code as the command line checker).
+3. Displays the best Pyodide (and PyScript) release for the requirements,
+   along with the status and version of each package in it, and how long
+   the check took. Any newer (or better) Pyodide release not yet used by
+   PyScript is noted below it.
+"""
+from pyscript import when
+from pyscript.web import page
+import js
+import fetch_cache
+import check_requirements
+
+
+# The lookup index, loaded from ../api/lookup.json.
+lookup = None
+
+STATUS_BADGES = {
+    "green": '<span class="status-badge green">✅</span>',
+    "amber": '<span class="status-badge amber">⚠️</span>',
+    "red": '<span class="status-badge red">❌</span>',
+    "unknown": '<span class="status-badge">🤷</span>',
+}
+
+
+def escape(text):
+    """
+    Escape the text for use in HTML (and its attributes), as html.escape
+    does (which MicroPython doesn't have).
+    """
+    return (
+        str(text)
+        .replace("&", "&amp;")
+        .replace("<", "&lt;")
+        .replace(">", "&gt;")
+        .replace('"', "&quot;")
+        .replace("'", "&#x27;")
+    )
+
+
+def render_results(result):
+    """
+    Return the HTML for the result of checking the requirements. The names
+    and specifiers come from the requirements pasted (or chosen), so are
+    escaped.
+    """
+    rows = []
+    for package in result["packages"]:
+        name = escape(package["name"])
+        if package["in_pyodide"]:
+            provided = escape(package["version"] or "not included")
+        else:
+            provided = "via micropip"
+        specifier = escape(package["specifier"] or "any")
+        rows.append(
+            f"<tr><td>{STATUS_BADGES[package['status']]}</td>"
+            f'<td><a href="../package?package={name}">{name}</a></td>'
+            f"<td><code>{specifier}</code></td>"
+            f"<td>{provided}</td>"
+            f"<td>{'✅' if package['ok'] else '❌'}</td></tr>"
+        )
+    if result["release"]:
+        summary = (
+            f"<h3>{STATUS_BADGES[result['status']]} Best release: Pyodide "
+            f"{result['release']} (PyScript {result['pyscript_version']})</h3>"
+        )
+    else:
+        summary = f"<h3>{STATUS_BADGES[result['status']]} No Pyodide release found</h3>"
+    if result["pyodide_only_release"]:
+        summary += (
+            f"<p>Pyodide {result['pyodide_only_release']} is newer (or "
+            "satisfies more of the requirements), but isn't used by any "
+            "PyScript release yet.</p>"
+        )
+    return (
+        summary
+        + "<table><thead><tr><th>Status</th><th>Package</th><th>Requires</th>"
+        + "<th>In Pyodide</th><th>OK</th></tr></thead><tbody>"
+        + "".join(rows)
+        + "</tbody></table>"
+    )
+
+
+def run_check(text):
+    """
+    Check the requirements in the text and display the results, along with
+    how long that took.
+    """
+    start = js.performance.now()
+    requirements = check_requirements.parse(text)
+    if not requirements:
+        page["#check-results"].innerHTML = "<p>🤷 No requirements found.</p>"
+        page["#check-timing"].innerText = ""
+        return
+    result = check_requirements.check(requirements, lookup)
+    page["#check-results"].innerHTML = render_results(result)
+    elapsed = js.performance.now() - start
+    page["#check-timing"].innerText = (
+        f"Checked {len(requirements)} requirements in {elapsed:.1f} ms"
+    )
+
+
+@when("submit", "#check-form")
+def check_text(event):
+    """
+    Check the requirements pasted into the text area.
+    """
+    event.preventDefault()
+    run_check(page["#requirements"].value)
+
+
+@when("change", "#requirements-file")
+async def check_file(event):
+    """
+    Check the requirements in the chosen file.
+    """
+    files = event.target.files
+    if not files.length:
+        return
+    text = await files.item(0).text()
+    page["#requirements"].value = text
+    if lookup:
+        run_check(text)
+
+
+lookup = await fetch_cache.get_json("../api/lookup.json", "../api")
+page["#loading-text"].remove()
+if lookup:
+    page["#check-button"].disabled = False
+else:
+    page["#check-results"].innerHTML = (
+        "<p>❌ Sorry, the package information couldn't be loaded.</p>"
+    )
@@ -0,0 +1,494 @@
+"""
+Check a whole list of requirements against the PyScript package support
+data in one go.
+
+It does three things:
+
+1. Parses the requirements, from either a requirements.txt file or the
+   dependencies of a pyproject.toml file, normalizing the package names as
+   per PEP 503.
+2. Looks each of them up in the lookup.json index generated by
+   build_data.py, which maps normalized package names to their status and
+   the version of them included in each Pyodide release.
+3. Works out the newest Pyodide release used by a PyScript release that
+   includes a version of every package Pyodide provides, that satisfies
+   the version specifiers of the requirements. If there isn't one, the
+   release that satisfies the most of them is used instead, and the
+   packages it doesn't satisfy are reported. Any newer (or better) Pyodide
+   release not yet used by PyScript is noted separately.
+
+Each package's releases are a bitmask (bit n is set if the nth oldest
+release will do), so finding the best release for hundreds of requirements
+only takes a few integer operations per requirement.
+
+The core of this module works in MicroPython, so it's used as is by the
+check page (check/main.py). It can also be run from the command line
+against a local copy of the data, e.g.:
+
+    python check_requirements.py requirements.txt
+
+which exits with a non-zero status if any of the requirements are not
+supported.
+"""
+import json
+
+
+# How bad each status is, from best to worst.
+STATUS_ORDER = ["green", "amber", "unknown", "red"]
+
+
+def normalize_name(name):
+    """
+    Normalize a package name as per PEP 503: lowercase, with runs of "-", "_"
+    and "." collapsed into a single "-".
+    """
+    result = ""
+    for char in name.strip().lower():
+        if char in "-_.":
+            if not result.endswith("-"):
+                result += "-"
+        else:
+            result += char
+    return result
+
+
+def parse_requirement(line):
+    """
+    Split a single requirement such as "numpy[extra]>=1.26,<3 ; python_version
+    > '3.8'" into its package name and version specifier (which may be "").
+    Returns None if the line isn't a requirement.
+    """
+    line = line.split(";")[0].strip()
+    if not line or line.startswith("-") or "://" in line.split("@")[0]:
+        # Options (e.g. "-r other.txt" or "-e .") and bare URLs.
+        return None
+    end = 0
+    while end < len(line) and (
+        line[end].isalpha() or line[end].isdigit() or line[end] in "-_."
+    ):
+        end += 1
+    name = line[:end]
+    if not name:
+        return None
+    rest = line[end:].strip()
+    if rest.startswith("["):
+        # Extras don't affect which package is needed.
+        rest = rest[rest.find("]") + 1 :].strip()
+    if rest.startswith("@"):
+        # A direct reference, so there's no version specifier.
+        rest = ""
+    specifier = rest.strip("()").replace(" ", "")
+    return name, specifier
+
+
+def parse_requirements_txt(text):
+    """
+    Return the (name, specifier) tuples of the requirements in the text of a
+    requirements.txt file.
+    """
+    requirements = []
+    for line in text.replace("\\\n", " ").splitlines():
+        line = line.strip()
+        if line.startswith("#"):
+            continue
+        line = line.split(" #")[0]
+        requirement = parse_requirement(line)
+        if requirement:
+            requirements.append(requirement)
+    return requirements
+
+
+def parse_pyproject(text):
+    """
+    Return the (name, specifier) tuples of the dependencies (and optional
+    dependencies) in the text of a pyproject.toml file. This isn't a full
+    TOML parser: it just collects the strings in the relevant arrays.
+    """
+    requirements = []
+    table = ""
+    in_array = False
+    for line in text.splitlines():
+        line = line.split(" #")[0].strip()
+        if line.startswith("#"):
+            continue
+        if not in_array and line.startswith("["):
+            table = line.strip("[] ")
+            continue
+        if not in_array and "=" in line:
+            key = line.split("=")[0].strip()
+            value = line[line.find("=") + 1 :].strip()
+            wanted = (table == "project" and key == "dependencies") or (
+                table == "project.optional-dependencies"
+            )
+            if wanted and value.startswith("["):
+                in_array = True
+                line = value[1:]
+        if in_array:
+            unquoted = line
+            for quote in "\"'":
+                parts = unquoted.split(quote)
+                for string in parts[1::2]:
+                    requirement = parse_requirement(string)
+                    if requirement:
+                        requirements.append(requirement)
+                unquoted = "".join(parts[0::2])
+            if "]" in unquoted:
+                # The end of the array (any "]" of extras are in the quotes).
+                in_array = False
+    return requirements
+
+
+def parse(text):
+    """
+    Return the (name, specifier) tuples of the requirements in the text of
+    either a requirements.txt or a pyproject.toml file.
+    """
+    if "[project]" in text:
+        return parse_pyproject(text)
+    return parse_requirements_txt(text)
+
+
+# The labels of the pre-release, post-release and development parts of a
+# version (and their alternative spellings), with how they rank.
+SUFFIX_LABELS = [
+    ("preview", 3),
+    ("alpha", 1),
+    ("beta", 2),
+    ("post", 5),
+    ("pre", 3),
+    ("rev", 5),
+    ("dev", 0),
+    ("rc", 3),
+    ("a", 1),
+    ("b", 2),
+    ("c", 3),
+    ("r", 5),
+]
+
+
+def parse_suffix(suffix):
+    """
+    Return a sort key for what follows the release segment of a version
+    (e.g. "rc1", ".post2" or ".dev3"), which puts development releases
+    before pre-releases, those before the final release, and post-releases
+    after it.
+    """
+    pre = None
+    post = -1
+    dev = None
+    while suffix:
+        suffix = suffix.lstrip("-_.")
+        rank = None
+        for label, label_rank in SUFFIX_LABELS:
+            if suffix.startswith(label):
+                rank = label_rank
+                suffix = suffix[len(label) :]
+                break
+        if rank is None:
+            # Not something we understand, so ignore the rest.
+            break
+        digits = ""
+        while suffix and suffix[0].isdigit():
+            digits += suffix[0]
+            suffix = suffix[1:]
+        number = int(digits) if digits else 0
+        if rank == 0:
+            dev = number
+        elif rank == 5:
+            post = number
+        else:
+            pre = (rank, number)
+    if pre is None:
+        # A development release of the final release comes before any of
+        # its pre-releases.
+        pre = (0, 0) if dev is not None and post < 0 else (4, 0)
+    return (pre, post, (0, dev) if dev is not None else (1, 0))
+
+
+def parse_version(version):
+    """
+    Parse a version string into a (release, suffix) tuple, where the release
+    is the numeric release segment as a tuple of ints and the suffix is the
+    sort key of the rest (see parse_suffix). For example, "2.2.5" has the
+    release (2, 2, 5) and "1.0rc1" the release (1, 0), and sorts before
+    "1.0".
+    """
+    version = version.split("+")[0].strip().lower()
+    if version.startswith("v"):
+        version = version[1:]
+    parts = []
+    position = 0
+    while True:
+        digits = ""
+        while position < len(version) and version[position].isdigit():
+            digits += version[position]
+            position += 1
+        if not digits:
+            break
+        parts.append(int(digits))
+        if version[position : position + 1] != "." or not version[
+            position + 1 : position + 2
+        ].isdigit():
+            break
+        position += 1
+    return tuple(parts), parse_suffix(version[position:])
+
+
+def compare_versions(a, b):
+    """
+    Compare two parsed versions, returning -1, 0 or 1.
+    """
+    a_release, a_suffix = a
+    b_release, b_suffix = b
+    length = max(len(a_release), len(b_release))
+    a = (a_release + (0,) * (length - len(a_release)), a_suffix)
+    b = (b_release + (0,) * (length - len(b_release)), b_suffix)
+    return (a > b) - (a < b)
+
+
+def satisfies(version, specifier):
+    """
+    Return True if the version string satisfies the (comma separated)
+    version specifier, e.g. ">=1.26,<3" or "==2.*".
+    """
+    if not specifier:
+        return True
+    parsed = parse_version(version)
+    release = parsed[0]
+    for clause in specifier.split(","):
+        if not clause:
+            continue
+        operator = ""
+        while clause and clause[0] in "=!<>~":
+            operator += clause[0]
+            clause = clause[1:]
+        if operator == "===":
+            if version != clause:
+                return False
+            continue
+        if clause.endswith(".*"):
+            prefix = parse_version(clause[:-2])[0]
+            matches = release[: len(prefix)] + (0,) * (
+                len(prefix) - len(release)
+            ) == prefix
+            if (operator == "==") != matches:
+                return False
+            continue
+        target = parse_version(clause)
+        comparison = compare_versions(parsed, target)
+        if operator == "~=":
+            # Compatible release: >= the target, and == all but its last part.
+            prefix = target[0][:-1]
+            if comparison < 0 or release[: len(prefix)] != prefix:
+                return False
+        elif operator in ("==", ""):
+            if comparison != 0:
+                return False
+        elif operator == "!=":
+            if comparison == 0:
+                return False
+        elif operator == ">=":
+            if comparison < 0:
+                return False
+        elif operator == "<=":
+            if comparison > 0:
+                return False
+        elif operator == ">":
+            if comparison <= 0:
+                return False
+        elif operator == "<":
+            if comparison >= 0:
+                return False
+    return True
+
+
+def best_release(counts, ordinals):
+    """
+    Return the ordinal of the newest of the given releases that will do for
+    the most packages (the counts are by ordinal), or -1 if there are none.
+    """
+    best = -1
+    for ordinal in ordinals:
+        if best < 0 or counts[ordinal] > counts[best] or (
+            counts[ordinal] == counts[best] and ordinal > best
+        ):
+            best = ordinal
+    return best
+
+
+def check(requirements, lookup):
+    """
+    Check the (name, specifier) requirements against the lookup.json index.
+
+    Returns a dict describing the best Pyodide release for the requirements
+    (and the PyScript release using it), any better Pyodide release not yet
+    used by PyScript, the overall status and a list with the details of
+    each package:
+
+    {
+        "release": "0.29.1" or None,
+        "pyscript_version": "2026.1.1" or "unknown",
+        "pyodide_only_release": "0.29.2" or None,
+        "status": "green" | "amber" | "unknown" | "red",
+        "packages": [
+            {
+                "name": "numpy",
+                "specifier": ">=2",
+                "status": "green" | "amber" | "unknown" | "red",
+                "in_pyodide": true | false,
+                "version": The version in the best release, or None,
+                "ok": Whether the best release will do for the package,
+            },
+            ...
+        ]
+    }
+    """
+    releases = lookup["releases"]
+    versions = lookup["versions"]
+    packages = lookup["packages"]
+    results = []
+    entries = []
+    masks = []
+    for name, specifier in requirements:
+        entry = packages.get(normalize_name(name))
+        result = {
+            "name": name,
+            "specifier": specifier,
+            "status": "unknown",
+            "in_pyodide": False,
+            "version": None,
+            "ok": False,
+        }
+        mask = None
+        if entry:
+            result["name"] = entry[0]
+            result["status"] = entry[1]
+            if entry[2]:
+                result["in_pyodide"] = True
+                mask = 0
+                for ordinal, cell in enumerate(entry[2]):
+                    if cell and satisfies(versions[cell - 1], specifier):
+                        mask |= 1 << ordinal
+        results.append(result)
+        entries.append(entry)
+        masks.append(mask)
+    # How many of the packages Pyodide provides each release will do for.
+    counts = []
+    for ordinal in range(len(releases)):
+        bit = 1 << ordinal
+        count = 0
+        for mask in masks:
+            if mask is not None and mask & bit:
+                count += 1
+        counts.append(count)
+    # The best release that PyScript uses (or the best of them all, if
+    # PyScript uses none of them), and the best of them all.
+    pyscript_versions = lookup["pyscript_versions"]
+    best = best_release(
+        counts,
+        [
+            ordinal
+            for ordinal in range(len(releases))
+            if pyscript_versions[ordinal] != "unknown"
+        ],
+    )
+    best_overall = best_release(counts, range(len(releases)))
+    if best < 0:
+        best = best_overall
+    status = 0
+    for result, entry, mask in zip(results, entries, masks):
+        if mask is None:
+            # Not in Pyodide, so whether it works depends on its status.
+            result["ok"] = result["status"] in ("green", "amber")
+        elif best >= 0 and mask & (1 << best):
+            result["ok"] = True
+            result["version"] = versions[entry[2][best] - 1]
+        else:
+            # A conflict: the best release doesn't provide a suitable version.
+            result["ok"] = False
+            if best >= 0 and entry[2][best]:
+                result["version"] = versions[entry[2][best] - 1]
+            result["status"] = "red"
+        status = max(status, STATUS_ORDER.index(result["status"]))
+    return {
+        "release": releases[best] if best >= 0 else None,
+        "pyscript_version": pyscript_versions[best] if best >= 0 else "unknown",
+        "pyodide_only_release": (
+            releases[best_overall] if best_overall != best else None
+        ),
+        "status": STATUS_ORDER[status],
+        "packages": results,
+    }
+
+
+def main(argv=None):
+    """
+    Check requirements files against a local copy of the data.
+    """
+    import argparse
+    import os
+    import sys
+
+    parser = argparse.ArgumentParser(
+        description="Check requirements against the PyScript package data."
+    )
+    parser.add_argument(
+        "files",
+        nargs="+",
+        help="requirements.txt or pyproject.toml files to check.",
+    )
+    parser.add_argument(
+        "--lookup",
+        default=os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "api", "lookup.json"
+        ),
+        help="Path to the lookup.json index (default: api/lookup.json).",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Output the results as JSON.",
+    )
+    args = parser.parse_args(argv)
+    try:
+        with open(args.lookup, "r") as f:
+            lookup = json.load(f)
+    except FileNotFoundError:
+        print(
+            f"No lookup index at {args.lookup}. Run build_data.py first to "
+            "generate it (or use --lookup to point at one).",
+            file=sys.stderr,
+        )
+        sys.exit(2)
+    requirements = []
+    for filename in args.files:
+        with open(filename, "r") as f:
+            requirements.extend(parse(f.read()))
+    result = check(requirements, lookup)
+    if args.json:
+        print(json.dumps(result, indent=4))
+    else:
+        for package in result["packages"]:
+            mark = "ok" if package["ok"] else "--"
+            version = package["version"] or ""
+            print(
+                f"{mark} {package['name']}{package['specifier']}: "
+                f"{package['status']} {version}".rstrip()
+            )
+        print(
+            f"Best Pyodide release: {result['release']} "
+            f"(PyScript {result['pyscript_version']}). "
+            f"Overall status: {result['status']}."
+        )
+        if result["pyodide_only_release"]:
+            print(
+                f"Pyodide {result['pyodide_only_release']} is newer (or "
+                "satisfies more of the requirements), but isn't used by any "
+                "PyScript release yet."
+            )
+    ok = all(package["ok"] for package in result["packages"])
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+A small browser-side cache of fetched JSON, shared by home.py and
+package/main.py.
+
+Fetched JSON is kept in the browser's localStorage, keyed by (absolute) URL
+and stamped with the `last_run` value from api/last_run.json. Since that
+value changes every time the data is rebuilt, cached entries are valid
+exactly until the next rebuild, and are otherwise served without touching
+the network.
+
+The current `last_run` value is itself revalidated once per page load (a
+conditional request, so usually just a 304), so a rebuild is picked up by
+the next page loaded, while the data files themselves are only fetched
+again once they've actually been rebuilt.
+"""
+import json
+import js
+from pyscript import fetch
+
+
+# Prefix for the keys of everything this module stores.
+PREFIX = "pyscript-packages:"
+
+# Don't cache responses bigger than this (in characters), to stay well
+# within the browser's localStorage quota.
+MAX_ENTRY_SIZE = 512 * 1024
+
+stamp = None
+
+
+def absolute_url(url):
+    """
+    Resolve the URL relative to the current page.
+    """
+    return js.URL.new(url, js.window.location.href).href
+
+
+async def get_stamp(api_url):
+    """
+    Return the `last_run` value of the current data build, revalidated
+    once per page load.
+    """
+    global stamp
+    if stamp is None:
+        response = await fetch(f"{api_url}/last_run.json", cache="no-cache")
+        stamp = (await response.json())["last_run"] if response.ok else ""
+    return stamp
+
+
+def read(key, current_stamp):
+    """
+    Return a (hit, data) tuple for the cached entry under the key.
+    """
+    entry = js.localStorage.getItem(key)
+    if entry:
+        entry = json.loads(entry)
+        if entry["stamp"] == current_stamp:
+            return True, entry["data"]
+        js.localStorage.removeItem(key)
+    return False, None
+
+
+def write(key, current_stamp, data):
+    """
+    Cache the data under the key, unless it's too big. If the browser's
+    storage is full, everything this module cached is cleared out.
+    """
+    entry = json.dumps({"stamp": current_stamp, "data": data})
+    if len(entry) > MAX_ENTRY_SIZE:
+        return
+    try:
+        js.localStorage.setItem(key, entry)
+    except Exception:
+        clear()
+
+
+def clear():
+    """
+    Remove everything this module has cached.
+    """
+    keys = [js.localStorage.key(i) for i in range(js.localStorage.length)]
+    for key in keys:
+        if key and key.startswith(PREFIX):
+            js.localStorage.removeItem(key)
+
+
+async def get_json(url, api_url):
+    """
+    Fetch JSON data from a URL, via the cache. Returns None if the URL
+    doesn't respond with a 200 status (which is also cached).
+
+    The api_url is the (relative) URL of the api directory, from which the
+    stamp for cached entries is fetched.
+    """
+    current_stamp = await get_stamp(api_url)
+    key = PREFIX + absolute_url(url)
+    if current_stamp:
+        hit, data = read(key, current_stamp)
+        if hit:
+            return data
+    response = await fetch(url)
+    data = None
+    if response.status == 200:
+        data = await response.json()
+    if current_stamp and response.status in (200, 404):
+        write(key, current_stamp, data)
+    return data
@@ -2,48 +2,378 @@
 A script for the home page of the PyScript Packages site.
 
 It fetches the top 100 PyPI packages and displays them with their
-PyScript support status.
+PyScript support status, optionally filtered by status. The list is
+rendered as a single HTML string inserted into the page in one go, a batch
+(BATCH_SIZE packages) at a time: the first straight away, then the next as
+the user scrolls to the end of the list, so a long list costs no more to
+show than a short one. If build_data.py listed more than 100 top packages
+(see its --top option), the rest are loaded from the pages of them in
+/api/top/, a page at a time, as the user scrolls on. The time to the list
+being painted is logged to the console (and recorded as a
+"top-packages-painted" performance mark).
+
+Usually build_data.py has already prerendered the first batch into the
+page (so it's shown before PyScript has even started), in which case this
+script just hydrates it: it takes over from where the prerendered list
+ends, for filtering and further batches.
+
+It also loads a prebuilt index of all known package names, so suggestions
+can be offered (entirely client side) as the user types into the search
+box. Matches on the start of a (normalized) package name come first,
+followed by fuzzy matches found via the trigrams the names have in common.
+
+All these files are fetched via the browser-side cache in fetch_cache.py.
 """
+import asyncio
 import js
-from pyscript import fetch
-from pyscript.web import page, a
+from pyscript import when
+from pyscript.ffi import create_proxy, to_js
+from pyscript.web import page
+from fetch_cache import get_json
+
+# The maximum number of suggestions to show as the user types.
+MAX_SUGGESTIONS = 8
+# The number of top packages to render at a time.
+BATCH_SIZE = 100
+# The number of packages in each page of /api/top/. This must match
+# build_data.py.
+TOP_PAGE_SIZE = 100
+
+# The top packages loaded so far, those of them matching the status filter
+# and the number of those rendered so far.
+top_packages = []
+shown_packages = []
+shown = 0
+# The status filter, and the total number of top packages (including those
+# not loaded yet).
+status_filter = "all"
+total_packages = 0
+loading = False
+
+# The search index, loaded from ./api/search.json.
+packages = []
+trigrams = {}
+
 
 def get_package_name():
     """
     Extract the package name from the query string.
 
-    Package names are case insensitive, so we convert to lowercase.
+    Package names are case insensitive (and so on), so we normalize them as
+    per PEP 503.
     """
     query_string = js.window.location.search
     url_params = js.URLSearchParams.new(query_string)
     package_name = url_params.get("q")
     if package_name:
-        return package_name.strip().lower()
+        return normalize_name(package_name)
     return None
 
-package_name = get_package_name()
 
-if package_name:
-    js.window.location.replace(f"./package?package={package_name}")
+def normalize_name(name):
+    """
+    Normalize a package name as per PEP 503: lowercase, with runs of "-", "_"
+    and "." collapsed into a single "-".
+    """
+    result = ""
+    for char in name.strip().lower():
+        if char in "-_.":
+            if not result.endswith("-"):
+                result += "-"
+        else:
+            result += char
+    return result
 
-top100 = await fetch("./api/top_100_pypi_packages.json").json()
 
-target = page["#top100"]
+def name_trigrams(key):
+    """
+    The set of trigrams in a normalized package name, ignoring separators.
 
-for pkg in top100["packages"]:
-    status = pkg.get("status", "unknown")
+    This must match the implementation in build_data.py.
+    """
+    compact = key.replace("-", "")
+    if len(compact) < 3:
+        return {compact} if compact else set()
+    return {compact[i : i + 3] for i in range(len(compact) - 2)}
+
+
+def first_with_prefix(prefix):
+    """
+    Binary search for the position of the first package whose normalized
+    name is not less than the prefix.
+    """
+    low, high = 0, len(packages)
+    while low < high:
+        middle = (low + high) // 2
+        if packages[middle][0] < prefix:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def suggest(query):
+    """
+    Return the positions in the index of the packages best matching the
+    query: prefix matches first, then fuzzy (trigram) matches.
+    """
+    key = normalize_name(query)
+    if not key:
+        return []
+    results = []
+    position = first_with_prefix(key)
+    while (
+        position < len(packages)
+        and packages[position][0].startswith(key)
+        and len(results) < MAX_SUGGESTIONS
+    ):
+        results.append(position)
+        position += 1
+    if len(results) < MAX_SUGGESTIONS:
+        query_trigrams = name_trigrams(key)
+        scores = {}
+        for trigram in query_trigrams:
+            for position in trigrams.get(trigram, []):
+                scores[position] = scores.get(position, 0) + 1
+        # Only suggest packages sharing at least half the query's trigrams.
+        threshold = max(1, len(query_trigrams) // 2)
+        fuzzy = [
+            (-score, len(packages[position][0]), position)
+            for position, score in scores.items()
+            if score >= threshold and position not in results
+        ]
+        fuzzy.sort()
+        for _, _, position in fuzzy[: MAX_SUGGESTIONS - len(results)]:
+            results.append(position)
+    return results
+
+
+def status_badge(status):
+    """
+    Return the HTML for the badge of the given status.
+    """
     if status == "green":
-        status_badge = '<span class="status-badge green">✅</span>'
+        return '<span class="status-badge green">✅</span>'
     elif status == "amber":
-        status_badge = '<span class="status-badge amber">⚠️</span>'
-    else:
-        status_badge = '<span class="status-badge red">❌</span>'
-    
-    package_item = a(f'''
+        return '<span class="status-badge amber">⚠️</span>'
+    return '<span class="status-badge red">❌</span>'
+
+
+def escape(text):
+    """
+    Escape the text for use in HTML (and its attributes), as html.escape
+    does (which MicroPython doesn't have).
+    """
+    return (
+        str(text)
+        .replace("&", "&amp;")
+        .replace("<", "&lt;")
+        .replace(">", "&gt;")
+        .replace('"', "&quot;")
+        .replace("'", "&#x27;")
+    )
+
+
+def package_url(name):
+    """
+    Return the URL of the prerendered page of the named package. (A package
+    named "index" can't have one, so gets the package page.)
+
+    This must match the implementation in prerender.py.
+    """
+    if name == "index":
+        return f"./package?package={name}"
+    return f"./package/{name}.html"
+
+
+def package_item(pkg):
+    """
+    Return the HTML for the item in the list of top packages of the given
+    package. The name and summary come from PyPI, so are escaped.
+
+    This must match the implementation in prerender.py.
+    """
+    status = pkg.get("status", "unknown")
+    name = escape(pkg["package_name"])
+    return f'''<a href="{package_url(name)}" class="package-item status-{status}">
   <div class="package-header">
-    <span class="package-name">{pkg["package_name"]}</span>
-    {status_badge}
+    <span class="package-name">{name}</span>
+    {status_badge(status)}
   </div>
-  <p class="package-desc">{pkg["summary"]}</p>
-''', href=f"./package?package={pkg["package_name"]}", classes=["package-item", f"status-{status}"])
-    target.append(package_item)
\ No newline at end of file
+  <p class="package-desc">{escape(pkg["summary"] or "")}</p>
+</a>'''
+
+
+def matches_filter(pkg):
+    """
+    Return True if the package has the status being filtered for.
+    """
+    if status_filter == "all":
+        return True
+    return pkg.get("status", "unknown") == status_filter
+
+
+def show_more_marker():
+    """
+    Only keep watching for the end of the list if there's more to show.
+    """
+    more = shown < len(shown_packages) or len(top_packages) < total_packages
+    page["#top100-more"].style["display"] = "block" if more else "none"
+
+
+async def load_more():
+    """
+    Load the next pages of top packages from /api/top/, until one has
+    packages matching the status filter (or there are no more), and render
+    the next batch of them.
+    """
+    global loading, total_packages
+    if loading:
+        return
+    loading = True
+    try:
+        while len(top_packages) < total_packages:
+            number = len(top_packages) // TOP_PAGE_SIZE + 1
+            top_page = await get_json(f"./api/top/{number}.json", "./api")
+            if not top_page or not top_page["packages"]:
+                # The pages are missing (or out of date), so stop here.
+                total_packages = len(top_packages)
+                break
+            top_packages.extend(top_page["packages"])
+            matching = [
+                pkg for pkg in top_page["packages"] if matches_filter(pkg)
+            ]
+            if matching:
+                shown_packages.extend(matching)
+                break
+    finally:
+        loading = False
+    render_more()
+
+
+def render_more():
+    """
+    Render the next batch of the (filtered) top packages, with a single
+    insertion into the page. Once all those loaded are rendered, the next
+    page of them is loaded (if there is one).
+    """
+    global shown
+    batch = shown_packages[shown : shown + BATCH_SIZE]
+    if batch:
+        js.document.getElementById("top100").insertAdjacentHTML(
+            "beforeend", "".join(package_item(pkg) for pkg in batch)
+        )
+        shown += len(batch)
+    elif len(top_packages) < total_packages:
+        asyncio.create_task(load_more())
+    elif not shown_packages:
+        js.document.getElementById("top100").innerHTML = (
+            '<p class="package-empty">No packages with this status.</p>'
+        )
+    show_more_marker()
+
+
+def render_more_when_visible(entries, observer):
+    """
+    Render the next batch of packages when the end of the list scrolls into
+    view.
+    """
+    for i in range(entries.length):
+        if entries[i].isIntersecting:
+            render_more()
+
+
+def render_top_packages(status="all"):
+    """
+    (Re)render the list of top packages with the given status (or all of
+    them). Only the first batch is rendered straight away, the rest as the
+    user scrolls down to them.
+    """
+    global shown_packages, shown, status_filter
+    start = js.performance.now()
+    status_filter = status
+    shown_packages = [pkg for pkg in top_packages if matches_filter(pkg)]
+    shown = 0
+    page["#top100"].innerHTML = ""
+    render_more()
+    elapsed = js.performance.now() - start
+    js.console.log(
+        f"Rendered {shown} of {len(shown_packages)} top packages "
+        f"in {elapsed:.1f} ms"
+    )
+
+
+def mark_first_paint(timestamp):
+    """
+    Record when the list of top packages was first painted (this is called
+    just before the frame that paints it).
+    """
+    js.performance.mark("top-packages-painted")
+    js.console.log(f"Time to top packages painted: {js.performance.now():.0f} ms")
+
+
+@when("click", ".status-filter")
+def filter_by_status(event):
+    """
+    Only show the top packages with the chosen status (or all of them).
+    """
+    status = event.currentTarget.getAttribute("data-status")
+    buttons = js.document.querySelectorAll(".status-filter")
+    for i in range(buttons.length):
+        pressed = buttons[i].getAttribute("data-status") == status
+        buttons[i].setAttribute("aria-pressed", "true" if pressed else "false")
+    render_top_packages(status)
+
+
+@when("input", "#package")
+def show_suggestions(event):
+    """
+    Update the suggestions for what the user has typed so far, and record
+    how long that took.
+    """
+    start = js.performance.now()
+    results = suggest(event.target.value)
+    items = []
+    for position in results:
+        _, name, status = packages[position]
+        name = escape(name)
+        items.append(
+            f'<li><a href="{package_url(name)}">'
+            f"{name} {status_badge(status)}</a></li>"
+        )
+    page["#suggestions"].innerHTML = "".join(items)
+    elapsed = js.performance.now() - start
+    timing = page["#suggestions-timing"]
+    if event.target.value.strip():
+        timing.innerText = f"{len(results)} suggestions in {elapsed:.1f} ms"
+    else:
+        timing.innerText = ""
+
+
+package_name = get_package_name()
+
+if package_name:
+    js.window.location.replace(f"./package?package={package_name}")
+
+top100 = await get_json("./api/top_100_pypi_packages.json", "./api")
+top_packages = top100["packages"]
+total_packages = top100.get("total", len(top_packages))
+prerendered = js.document.querySelectorAll("#top100 .package-item").length
+if prerendered:
+    # build_data.py prerendered the first batch, so carry on from there.
+    shown_packages = list(top_packages)
+    shown = prerendered
+    show_more_marker()
+else:
+    render_top_packages()
+    js.requestAnimationFrame(create_proxy(mark_first_paint))
+observer = js.IntersectionObserver.new(
+    create_proxy(render_more_when_visible), to_js({"rootMargin": "400px"})
+)
+observer.observe(js.document.getElementById("top100-more"))
+
+# Load the search index last, since it's only needed once the user types.
+search_index = await get_json("./api/search.json", "./api")
+if search_index:
+    packages = search_index["packages"]
+    trigrams = search_index["trigrams"]
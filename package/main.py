@@ -3,31 +3,91 @@ A MicroPython based script for checking PyScript package support.
 
 It does four things:
 
-1. Extracts the package name from the query string (e.g. `/package?package=<package_name>`).
-2. Grabs the package metadata from PyPI (e.g. https://pypi.org/pypi/<package_name>/json).
-3. Grabs the package support status from the /api/package/<package_name>.json file.
-4. If step 3 fails, it falls back to a default "amber" status and attempts to make a simple
+1. Extracts the package name from the query string (e.g. `/package?package=<package_name>`),
+   normalized as per PEP 503.
+2. Grabs the package support status from the /api/package/<package_name>.json file.
+3. Grabs the package metadata from PyPI (e.g. https://pypi.org/pypi/<package_name>/json),
+   but only if the data file from step 2 doesn't already include it.
+4. If step 2 fails, it falls back to a default "amber" status and attempts to make a simple
    Pyodide import test for the package, along with an embedded Google form for user feedback.
 
+Since our own data already has the status and summary, these are displayed
+as soon as they arrive, and the details from PyPI are filled in when they're
+ready. If PyPI takes longer than PYPI_TIMEOUT seconds, we carry on without
+it. The notes are usually prerendered to HTML by build_data.py. Only if
+they're not are the JS modules used to render Markdown loaded (concurrently
+with step 3). The time to first status and to a fully rendered page are
+logged to the console (and recorded as "first-status" and "page-ready"
+performance marks).
+
+Pages for known packages (package/<package_name>.html) are prerendered by
+build_data.py with the status, summary, PyPI details and notes already in
+place, so they're shown before PyScript has even started. On those pages,
+this script only hydrates the interactive parts (the import check and the
+feedback form), and fills in anything the build didn't have.
+
+The Pyodide import check only starts Pyodide when the user first runs it,
+which takes a while. Users can opt in (via a checkbox by the check, which
+is remembered in localStorage) to have it prewarmed instead: once the page
+is idle, the check's Pyodide worker is started and the package (and its
+dependencies) installed with micropip in the background, so that running
+the check is near-instant. How long that took is shown to the user (and
+recorded as "smoketest-prewarm-start" and "smoketest-prewarmed" performance
+marks).
+
 That's it!
 
 The static JSON data files in this website are of the form:
 {
     "status": "red" | "amber" | "green",
     "notes": "Some notes about the package support status as Markdown.",
+    "notes_html": "The notes rendered to (sanitized) HTML.",
     "updated_by": "A name or handle of the person who last updated this file.",
-    "updated_at": "ISO 8601 timestamp of when this file was last updated."
+    "updated_at": "ISO 8601 timestamp of when this file was last updated.",
+    "summary": "The summary of the package from PyPI.",
+    "pypi": {
+        "author": "The package author, from PyPI.",
+        "home_page": "The URL of the package's home page.",
+        "latest_version": "The latest version of the package on PyPI.",
+        "requires_python": "The package's supported Python versions.",
+        "has_pure_python_wheel": true | false,
+        "has_wasm_wheel": true | false
+    }
 }
 """
-from pyscript import fetch, js_import, when
+from pyscript import js_import, when
+from pyscript.ffi import create_proxy, to_js
 from pyscript.web import page, h3, script, iframe, p
 import js
 import asyncio
+import fetch_cache
 
 
 marked = None
 purify = None
 
+# Seconds to wait for PyPI before giving up on it.
+PYPI_TIMEOUT = 5
+
+# The localStorage key that records whether to prewarm the import check.
+PREWARM_KEY = "pyscript-packages-prewarm"
+# The longest to wait (in milliseconds) for the page to be idle before
+# prewarming anyway.
+PREWARM_IDLE_TIMEOUT = 5000
+# The longest to wait (in seconds) for PyScript to set up the editor.
+PREWARM_SETUP_TIMEOUT = 30
+# The code run in the import check's editor to prewarm it. Any errors are
+# left for the check itself to report.
+PREWARM_CODE = """import micropip
+try:
+    await micropip.install("{package_name}")
+except Exception:
+    pass
+"""
+
+# The task prewarming the import check, once it has started.
+prewarm_task = None
+
 
 async def load_js_modules():
     """
@@ -40,17 +100,40 @@ async def load_js_modules():
     )
 
 
+def normalize_name(name):
+    """
+    Normalize a package name as per PEP 503: lowercase, with runs of "-", "_"
+    and "." collapsed into a single "-". The package files are named this way.
+    """
+    result = ""
+    for char in name.strip().lower():
+        if char in "-_.":
+            if not result.endswith("-"):
+                result += "-"
+        else:
+            result += char
+    return result
+
+
 def get_package_name():
     """
     Extract the package name from the query string.
 
-    Package names are case insensitive, so we convert to lowercase.
+    Package names are case insensitive (and so on), so we normalize them as
+    per PEP 503. However the name is spelled, it resolves straight to the one
+    package file.
     """
     query_string = js.window.location.search
     url_params = js.URLSearchParams.new(query_string)
     package_name = url_params.get("package")
     if package_name:
-        return package_name.strip().lower()
+        package_name = normalize_name(package_name)
+        # Only letters, digits and separators make a valid package name, so
+        # nothing else from the query string ends up in the page.
+        for char in package_name:
+            if not (char.isalpha() or char.isdigit() or char == "-"):
+                return None
+        return package_name
     return None
 
 
@@ -67,21 +150,20 @@ def from_markdown(raw_markdown):
 
 async def get_json(url):
     """
-    Fetch JSON data from a URL.
+    Fetch JSON data from a URL, via the browser-side cache (which is
+    invalidated whenever the data is rebuilt).
     """
-    response = await fetch(url)
-    if response.status == 200:
-        data = await response.json()
-        return data
-    return None
+    return await fetch_cache.get_json(url, "../api")
 
 
 async def fetch_pypi_metadata(package_name):
     """
     Fetch package metadata from PyPI.
+
+    Raises asyncio.TimeoutError if PyPI doesn't respond in time.
     """
     pypi_url = f"https://pypi.org/pypi/{package_name}/json"
-    return await get_json(pypi_url)
+    return await asyncio.wait_for(get_json(pypi_url), PYPI_TIMEOUT)
 
 
 async def fetch_package_data(package_name):
@@ -91,69 +173,145 @@ async def fetch_package_data(package_name):
     data_url = f"../api/package/{package_name}.json"
     return await get_json(data_url)
 
-async def main():
+
+def escape(text):
     """
-    Main function to handle the package support check.
+    Escape the text for use in HTML (and its attributes), as html.escape
+    does (which MicroPython doesn't have).
     """
-    await load_js_modules()
-    target = page["#app"]
-    loading_text = page["#loading-text"]
-    metadata_target = page["#metadata"]
-    smoketest_target = page["#smoketest"]
-    feedback_target = page["#feedback"]
-    smoketest_button = page["#smoketest-button"]
-    package_name = get_package_name()
-    if not package_name:
-        target.innerHTML = "<h2>🤷 No package specified.</h2>"
+    return (
+        str(text)
+        .replace("&", "&amp;")
+        .replace("<", "&lt;")
+        .replace(">", "&gt;")
+        .replace('"', "&quot;")
+        .replace("'", "&#x27;")
+    )
+
+
+def render_pypi_details(pypi):
+    """
+    Return the HTML for the details of the package recorded on PyPI. These
+    come from the package's authors, so are escaped, and the home page is
+    only linked to if it's a web page. This must match the implementation
+    in prerender.py.
+    """
+    yes_no = {True: "✅", False: "❌"}
+    html = f"<p><strong>Author:</strong> {escape(pypi.get('author') or 'unknown')}</p>"
+    if pypi.get("latest_version"):
+        html += f"<p><strong>Latest version:</strong> {escape(pypi['latest_version'])}</p>"
+    if pypi.get("requires_python"):
+        html += f"<p><strong>Requires Python:</strong> {escape(pypi['requires_python'])}</p>"
+    home_page = pypi.get("home_page")
+    if home_page and (
+        home_page.lower().startswith("http://")
+        or home_page.lower().startswith("https://")
+    ):
+        home_page = escape(home_page)
+        html += f'<p><strong>Home page:</strong> <a href="{home_page}" target="_blank">{home_page}</a></p>'
+    if "has_pure_python_wheel" in pypi:
+        html += (
+            "<p><strong>Wheels:</strong> "
+            f"pure Python {yes_no[pypi['has_pure_python_wheel']]} · "
+            f"WebAssembly {yes_no[pypi['has_wasm_wheel']]}</p>"
+        )
+    return html
+
+
+async def fill_in_pypi_details(package_data, pypi_task):
+    """
+    Fill in the package details from PyPI: straight from our own data if we
+    have them, otherwise once PyPI has responded.
+    """
+    pypi = package_data.get("pypi")
+    if pypi is None:
+        try:
+            pypi_metadata = await pypi_task
+        except asyncio.TimeoutError:
+            pypi_metadata = None
+        package_info = (pypi_metadata or {}).get("info", {})
+        pypi = {
+            "author": package_info.get("author"),
+            "home_page": package_info.get("home_page"),
+            "latest_version": package_info.get("version"),
+            "requires_python": package_info.get("requires_python"),
+        }
+    page["#pypi-details"].innerHTML = render_pypi_details(pypi)
+
+
+async def fill_in_notes(package_data):
+    """
+    Fill in the notes: prerendered if possible, otherwise rendered from
+    Markdown once the JS modules for doing so are loaded.
+    """
+    notes_html = package_data.get("notes_html")
+    if notes_html is None:
+        await load_js_modules()
+        notes_html = from_markdown(package_data.get("notes", ""))
+    page["#package-notes"].innerHTML = notes_html
+
+
+async def prewarm(package_name):
+    """
+    Start the import check's Pyodide worker and install the package (and its
+    dependencies) in it, so the check runs near-instantly when the user
+    clicks Run. This all happens in the editor's worker, so it doesn't block
+    the page. How long it took is shown next to the checkbox.
+    """
+    status = page["#prewarm-status"]
+    status.innerText = "⏳ Getting the check ready…"
+    editor = js.document.getElementById("test-script")
+    # The editor only has a process method once PyScript has set it up.
+    waited = 0
+    while not js.Reflect.has(editor, "process"):
+        if waited >= PREWARM_SETUP_TIMEOUT:
+            status.innerText = "❌ The editor isn't available to get ready."
+            return
+        await asyncio.sleep(0.1)
+        waited += 0.1
+    js.performance.mark("smoketest-prewarm-start")
+    start = js.performance.now()
+    try:
+        await editor.process(PREWARM_CODE.format(package_name=package_name))
+    except Exception as error:
+        status.innerText = f"❌ Couldn't get the check ready: {error}"
         return
-    pypi_metadata = await fetch_pypi_metadata(package_name)
-    if not pypi_metadata:
-        target.innerHTML = f"""<h2>🤷 Package '{package_name}' not found on PyPI.</h2>
-<p>Please check the package name and try again.</p>
+    js.performance.mark("smoketest-prewarmed")
+    elapsed = js.performance.now() - start
+    status.innerText = f"⚡ Ready to run (prepared in {elapsed / 1000:.1f} s)."
+    js.console.log(f"Time to prewarm the import check: {elapsed:.0f} ms")
 
-<p>(Here are the <a href="https://pyodide.org/en/stable/usage/packages-in-pyodide.html" target="_blank">packages currently available in Pyodide</a> 📦 or, alternatively, you can try searching for the package on <a href="https://pypi.org/search/?q={package_name}" target="_blank">PyPI</a> 🔍.)</p>
 
-        """
+def schedule_prewarm(package_name):
+    """
+    Prewarm the import check once the page is idle, unless the user has
+    asked their browser to save data.
+    """
+    if js.Reflect.has(js.navigator, "connection") and js.navigator.connection.saveData:
+        page["#prewarm-status"].innerText = "Skipped, to save data."
         return
-    # Remove the loading text.
-    loading_text.remove()
-    
-    # Extract relevant metadata from PYPI.
-    package_info = pypi_metadata.get("info", {})
-    package_author = package_info.get("author", "unknown")
-    package_summary = package_info.get("summary", "No summary available.")
 
-    # Try to extract package support data and work out the status.
-    package_data = await fetch_package_data(package_name)
-    if not package_data:
-        # Default to amber status if no data file exists
-        package_data = {
-            "status": "amber",
-            "notes": "No support data available. Please help us improve this by running some tests and submitting feedback. 🤗",
-            "updated_by": "N/A",
-            "updated_at": "N/A",
-        }
-    status_values = {
-        "red": "❌ Red - Not Supported",
-        "amber": "⚠️ Amber - Unknown Support",
-        "green": "✅ Green - Supported",
-    }
-    status = package_data.get("status", "amber")
-    status_content = status_values[status]
-    notes_markdown = package_data.get("notes", "")
-    notes_html = from_markdown(notes_markdown)
+    def start(*args):
+        global prewarm_task
+        if prewarm_task is None:
+            prewarm_task = asyncio.create_task(prewarm(package_name))
 
-    # Assemble the final HTML result.
+    if js.Reflect.has(js.window, "requestIdleCallback"):
+        js.requestIdleCallback(
+            create_proxy(start), to_js({"timeout": PREWARM_IDLE_TIMEOUT})
+        )
+    else:
+        js.setTimeout(create_proxy(start), 1000)
 
-    metadata_target.innerHTML = f"""
-    <h2><a href="https://pypi.org/project/{package_name}/" target="_blank">{package_name}</a></h2>
-    <h3>{status_content}</h3>
-    <p><strong>Author:</strong> {package_author}</p>
-    <p><strong>Summary:</strong> {package_summary}</p>
-    <p><a href="https://pypi.org/project/{package_name}/" target="_blank">PyPI page</a> 📦 | <a href="https://pypistats.org/packages/{package_name}" target="_blank">PyPI stats</a> 📈</p>
-    <hr />
-    <div>{notes_html}</div>
+
+def add_smoketest(package_name, status):
+    """
+    Add the Pyodide import check and the feedback form: shown straight away
+    for amber packages, otherwise behind a button.
     """
+    smoketest_target = page["#smoketest"]
+    feedback_target = page["#feedback"]
+    smoketest_button = page["#smoketest-button"]
     # We can try a simple Pyodide import test for amber packages.
     # Add a simple script to attempt the import.
     # Note: This is a very basic test and may not cover all cases.
@@ -183,6 +341,13 @@ print("✅ Successfully imported {package_name}!")
     editor = script(code, type="py-editor", id="test-script")
     editor.setAttribute("config", '{"packages": ["micropip"]}')
     smoketest_target.append(editor)
+    prewarm_toggle = p()
+    prewarm_toggle.innerHTML = (
+        '<label><input type="checkbox" id="prewarm-toggle" /> ⚡ Get this '
+        "check ready in the background whenever I visit a package page</label> "
+        '<span id="prewarm-status"></span>'
+    )
+    smoketest_target.append(prewarm_toggle)
     # Add a Google form for user feedback.
     example_description = js.encodeURIComponent(f"""I attempted to import the `{package_name}` package in Pyodide. I used the following code:
 
@@ -215,5 +380,123 @@ My experience was:
         feedback_target.style["display"] = "block"
         smoketest_button.style["display"] = "none"
 
+    @when("change", "#prewarm-toggle")
+    def toggle_prewarm(event):
+        if event.target.checked:
+            js.localStorage.setItem(PREWARM_KEY, "on")
+            schedule_prewarm(package_name)
+        else:
+            js.localStorage.removeItem(PREWARM_KEY)
+
+    if js.localStorage.getItem(PREWARM_KEY) == "on":
+        js.document.getElementById("prewarm-toggle").checked = True
+        schedule_prewarm(package_name)
+
+
+async def main():
+    """
+    Main function to handle the package support check.
+    """
+    target = page["#app"]
+    loading_text = page["#loading-text"]
+    metadata_target = page["#metadata"]
+    package_name = get_package_name()
+    if not package_name:
+        target.innerHTML = "<h2>🤷 No package specified.</h2>"
+        return
+    # Try to extract package support data and work out the status.
+    package_data = await fetch_package_data(package_name)
+    pypi_task = None
+    if not package_data or "pypi" not in package_data:
+        # Only ask PyPI about packages our own data has no details for.
+        pypi_task = asyncio.create_task(fetch_pypi_metadata(package_name))
+    if not package_data:
+        # We know nothing about this package, so check it's on PyPI.
+        try:
+            pypi_metadata = await pypi_task
+        except asyncio.TimeoutError:
+            # Give the package the benefit of the doubt.
+            pypi_metadata = {"info": {}}
+        if not pypi_metadata:
+            target.innerHTML = f"""<h2>🤷 Package '{package_name}' not found on PyPI.</h2>
+<p>Please check the package name and try again.</p>
+
+<p>(Here are the <a href="https://pyodide.org/en/stable/usage/packages-in-pyodide.html" target="_blank">packages currently available in Pyodide</a> 📦 or, alternatively, you can try searching for the package on <a href="https://pypi.org/search/?q={package_name}" target="_blank">PyPI</a> 🔍.)</p>
+
+        """
+            return
+        # Default to amber status if no data file exists
+        package_data = {
+            "status": "amber",
+            "notes": "No support data available. Please help us improve this by running some tests and submitting feedback. 🤗",
+            "notes_html": "<p>No support data available. Please help us improve this by running some tests and submitting feedback. 🤗</p>",
+            "updated_by": "N/A",
+            "updated_at": "N/A",
+            "summary": pypi_metadata["info"].get("summary"),
+        }
+    # Remove the loading text.
+    loading_text.remove()
+
+    status_values = {
+        "red": "❌ Red - Not Supported",
+        "amber": "⚠️ Amber - Unknown Support",
+        "green": "✅ Green - Supported",
+    }
+    status = package_data.get("status", "amber")
+    status_content = status_values[status]
+    package_summary = escape(package_data.get("summary") or "No summary available.")
 
-await main()
\ No newline at end of file
+    # Assemble the HTML result. The PyPI details and notes are filled in later.
+
+    metadata_target.innerHTML = f"""
+    <h2><a href="https://pypi.org/project/{package_name}/" target="_blank">{package_name}</a></h2>
+    <h3>{status_content}</h3>
+    <p><strong>Summary:</strong> {package_summary}</p>
+    <div id="pypi-details"><p><strong>Author:</strong> …</p></div>
+    <p><a href="https://pypi.org/project/{package_name}/" target="_blank">PyPI page</a> 📦 | <a href="https://pypistats.org/packages/{package_name}" target="_blank">PyPI stats</a> 📈</p>
+    <hr />
+    <div id="package-notes"></div>
+    """
+    js.performance.mark("first-status")
+    js.console.log(f"Time to first status: {js.performance.now():.0f} ms")
+
+    add_smoketest(package_name, status)
+
+    await asyncio.gather(
+        fill_in_pypi_details(package_data, pypi_task),
+        fill_in_notes(package_data),
+    )
+    js.performance.mark("page-ready")
+    js.console.log(f"Time to page ready: {js.performance.now():.0f} ms")
+
+
+async def hydrate(package_name, status, fill):
+    """
+    Hydrate a package page prerendered by build_data.py: add the interactive
+    parts, and fill in anything the build didn't have (as listed in fill).
+    """
+    add_smoketest(package_name, status)
+    if fill:
+        package_data = await fetch_package_data(package_name) or {}
+        tasks = []
+        if "pypi" in fill:
+            pypi_task = None
+            if "pypi" not in package_data:
+                pypi_task = asyncio.create_task(fetch_pypi_metadata(package_name))
+            tasks.append(fill_in_pypi_details(package_data, pypi_task))
+        if "notes" in fill:
+            tasks.append(fill_in_notes(package_data))
+        await asyncio.gather(*tasks)
+    js.performance.mark("page-ready")
+    js.console.log(f"Time to page ready: {js.performance.now():.0f} ms")
+
+
+prerendered = js.document.body.getAttribute("data-package")
+if prerendered:
+    await hydrate(
+        prerendered,
+        js.document.body.getAttribute("data-status"),
+        (js.document.body.getAttribute("data-fill") or "").split(),
+    )
+else:
+    await main()
\ No newline at end of file
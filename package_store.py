@@ -0,0 +1,211 @@
+"""
+The per-package JSON records of the data build (build_data.py), in the
+api/package directory, filed under their PEP 503 normalized names (see
+PackageStore).
+"""
+import hashlib
+import json
+import os
+import re
+
+import build_output
+from build_log import Progress, count, log, package_changed
+from build_output import write_if_changed, write_output
+from releases import release_key
+
+
+def normalize_name(name):
+    """
+    Normalize a package name as per PEP 503: lowercase, with runs of "-", "_"
+    and "." collapsed into a single "-".
+    """
+    return re.sub(r"[-_.]+", "-", name.strip()).lower()
+
+
+def merge_records(records):
+    """
+    Merge the records of a package filed under different spellings of its
+    name into one: the most recently updated of them (or, of those updated
+    at the same time, whichever covers the newest Pyodide release), with
+    any details it lacks filled in from the others.
+
+    The notes, their HTML and the Pyodide support they describe are never
+    mixed from different records. If the Pyodide support is out of date, the
+    pyodide stage regenerates the notes along with it.
+    """
+
+    def newest_release(record):
+        return max(
+            map(release_key, record.get("pyodide_versions") or {}), default=()
+        )
+
+    records = sorted(
+        records,
+        key=lambda record: (
+            record.get("updated_at") or "",
+            newest_release(record),
+        ),
+        reverse=True,
+    )
+    merged = dict(records[0])
+    for record in records[1:]:
+        if "notes" not in merged and "notes" in record:
+            # The notes only ever go with their own HTML.
+            merged["notes"] = record["notes"]
+            if "notes_html" in record:
+                merged["notes_html"] = record["notes_html"]
+        for key, value in record.items():
+            if key not in ("notes", "notes_html"):
+                merged.setdefault(key, value)
+    return merged
+
+
+class PackageStore:
+    """
+    The per-package JSON records in the api/package directory.
+
+    Records are filed under the PEP 503 normalized package name, and every
+    method accepts any spelling of a name, so "Jinja2", "jinja2" and
+    "JINJA2" all refer to the same record. Files under other spellings (from
+    older builds) are merged into a single record when the store is created,
+    and removed when it's flushed. The other spellings of names used by
+    Pyodide are recorded as aliases (in api/aliases.json).
+
+    Each record is read from disk at most once per run and then held in
+    memory. Records that are changed must be `put` back into the store, which
+    marks them as dirty; only dirty records are written out (atomically) when
+    the store is flushed at the end of the run.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = {}
+        self.dirty = set()
+        # Content hashes of the records written by flush, by package name.
+        self.written = {}
+        # Other spellings of package names, mapped to the normalized name.
+        self.aliases = {}
+        try:
+            with open(self.aliases_filename(), "r") as f:
+                self.aliases = json.load(f)
+            count("files_read")
+        except FileNotFoundError:
+            pass
+        # Files not named as per PEP 503, to be removed when flushed.
+        self.stale = set()
+        self.migrate()
+
+    def filename(self, package_name):
+        return os.path.join(self.path, f"{normalize_name(package_name)}.json")
+
+    def aliases_filename(self):
+        return os.path.join(os.path.dirname(self.path), "aliases.json")
+
+    def migrate(self):
+        """
+        Merge any package files not named as per PEP 503 into the record of
+        the normalized name.
+        """
+        spellings = {}
+        for filename in os.listdir(self.path):
+            if filename.endswith(".json"):
+                package_name = filename[:-5]
+                key = normalize_name(package_name)
+                spellings.setdefault(key, []).append(package_name)
+        for key, package_names in sorted(spellings.items()):
+            if package_names == [key]:
+                continue
+            records = []
+            for package_name in sorted(package_names):
+                with open(
+                    os.path.join(self.path, f"{package_name}.json"), "r"
+                ) as f:
+                    records.append(json.load(f))
+                count("files_read")
+                if package_name != key:
+                    self.aliases[package_name] = key
+                    self.stale.add(package_name)
+            self.put(key, merge_records(records))
+            log.info(
+                "Merged %s into %s.json", ", ".join(sorted(package_names)), key
+            )
+            package_changed(key, "merged", merged=sorted(package_names))
+
+    def alias(self, package_name):
+        """
+        Record the given spelling of a package's name as an alias of its
+        normalized name, which is returned.
+        """
+        key = normalize_name(package_name)
+        if package_name != key:
+            self.aliases[package_name] = key
+        return key
+
+    def get(self, package_name):
+        """
+        Return the record for the named package, or None if there isn't one.
+        """
+        package_name = normalize_name(package_name)
+        if package_name not in self.records:
+            try:
+                with open(self.filename(package_name), "r") as f:
+                    self.records[package_name] = json.load(f)
+                count("files_read")
+            except FileNotFoundError:
+                self.records[package_name] = None
+        return self.records[package_name]
+
+    def exists(self, package_name):
+        return self.get(package_name) is not None
+
+    def names(self):
+        """
+        Return the sorted names of all the packages in the store.
+        """
+        names = {
+            normalize_name(filename[:-5])
+            for filename in os.listdir(self.path)
+            if filename.endswith(".json")
+        }
+        names.update(
+            name for name, data in self.records.items() if data is not None
+        )
+        return sorted(names)
+
+    def put(self, package_name, data):
+        package_name = normalize_name(package_name)
+        self.records[package_name] = data
+        self.dirty.add(package_name)
+
+    def flush(self):
+        """
+        Write all the dirty records (and the aliases of the names of those
+        that exist) to disk, and remove the files merged into them.
+        """
+        with Progress("Writing package files", len(self.dirty)) as progress:
+            for package_name in sorted(self.dirty):
+                content = json.dumps(self.records[package_name], indent=4)
+                write_output(self.filename(package_name), content)
+                self.written[package_name] = hashlib.sha256(
+                    content.encode("utf-8")
+                ).hexdigest()
+                progress.update()
+        if build_output.dry_run:
+            log.info("Dry run: %d package files not written.", len(self.dirty))
+        else:
+            for package_name in sorted(self.stale):
+                os.remove(os.path.join(self.path, f"{package_name}.json"))
+            log.info(
+                "Wrote %d package files, removed %d merged into them.",
+                len(self.dirty),
+                len(self.stale),
+            )
+            self.stale.clear()
+        self.dirty.clear()
+        names = set(self.names())
+        aliases = {
+            alias: self.aliases[alias]
+            for alias in sorted(self.aliases)
+            if self.aliases[alias] in names
+        }
+        write_if_changed(self.aliases_filename(), json.dumps(aliases, indent=4))
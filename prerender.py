@@ -0,0 +1,250 @@
+"""
+Prerendering the pages of the site for the data build (build_data.py): a
+page for every package (in /package/, from the package page) and the list of
+top packages on the home page, so they show their content before PyScript
+starts. PyScript then only hydrates the interactive parts of them.
+
+The Markdown notes of each package are also rendered to sanitized HTML here
+(see render_notes). This needs the optional markdown and nh3 packages.
+"""
+import os
+from html import escape
+
+import build_output
+from build_log import count, log
+from build_output import write_if_changed
+
+try:
+    # Optional: only needed to render the notes to HTML at build time.
+    import markdown
+    import nh3
+except ImportError:
+    markdown = nh3 = None
+
+
+def render_notes(notes):
+    """
+    Render Markdown notes to sanitized HTML.
+    """
+    html = markdown.markdown(notes, extensions=["fenced_code", "tables"])
+    return nh3.clean(html)
+
+
+# The package page is the template for the prerendered package pages.
+PACKAGE_PAGE = os.path.join("package", "index.html")
+HOME_PAGE = "index.html"
+
+# How the package page describes each status.
+STATUS_DESCRIPTIONS = {
+    "red": "❌ Red - Not Supported",
+    "amber": "⚠️ Amber - Unknown Support",
+    "green": "✅ Green - Supported",
+}
+
+# The notes of packages we have no support data for.
+NO_DATA_NOTES_HTML = (
+    "<p>No support data available. Please help us improve this by running "
+    "some tests and submitting feedback. 🤗</p>"
+)
+
+
+def package_page_url(package_name):
+    """
+    Return the URL of the prerendered page of the named package, relative to
+    the site root. (A package named "index" can't have one, so gets the
+    package page.) This must match the implementation in home.py.
+    """
+    if package_name == "index":
+        return f"./package?package={package_name}"
+    return f"./package/{package_name}.html"
+
+
+def render_pypi_details(pypi):
+    """
+    Return the HTML for the details of the package recorded on PyPI. These
+    come from the package's authors, so are escaped, and the home page is
+    only linked to if it's a web page. This must match the implementation
+    in package/main.py.
+    """
+    yes_no = {True: "✅", False: "❌"}
+    author = escape(pypi.get("author") or "unknown")
+    html = f"<p><strong>Author:</strong> {author}</p>"
+    if pypi.get("latest_version"):
+        latest_version = escape(pypi["latest_version"])
+        html += f"<p><strong>Latest version:</strong> {latest_version}</p>"
+    if pypi.get("requires_python"):
+        requires_python = escape(pypi["requires_python"])
+        html += f"<p><strong>Requires Python:</strong> {requires_python}</p>"
+    home_page = pypi.get("home_page")
+    if home_page and (
+        home_page.lower().startswith("http://")
+        or home_page.lower().startswith("https://")
+    ):
+        home_page = escape(home_page)
+        html += f'<p><strong>Home page:</strong> <a href="{home_page}" target="_blank">{home_page}</a></p>'
+    if "has_pure_python_wheel" in pypi:
+        html += (
+            "<p><strong>Wheels:</strong> "
+            f"pure Python {yes_no[pypi['has_pure_python_wheel']]} · "
+            f"WebAssembly {yes_no[pypi['has_wasm_wheel']]}</p>"
+        )
+    return html
+
+
+def package_page(template, package_name, data):
+    """
+    Return the prerendered package page of the named package, from the
+    template (the package page) and the package's data.
+
+    Anything the data doesn't have (the details from PyPI, or the notes
+    rendered to HTML) is listed in the page's data-fill attribute, for
+    package/main.py to fill in when it hydrates the page.
+    """
+    status = data.get("status", "amber")
+    summary = escape(data.get("summary") or "No summary available.")
+    fill = []
+    pypi = data.get("pypi")
+    if pypi:
+        pypi_details = render_pypi_details(pypi)
+    else:
+        pypi_details = "<p><strong>Author:</strong> …</p>"
+        fill.append("pypi")
+    notes_html = data.get("notes_html")
+    if notes_html is None and markdown:
+        notes_html = render_notes(data.get("notes") or "")
+    elif notes_html is None:
+        notes_html = ""
+        fill.append("notes")
+    metadata = f"""<div id="metadata">
+    <h2><a href="https://pypi.org/project/{package_name}/" target="_blank">{package_name}</a></h2>
+    <h3>{STATUS_DESCRIPTIONS[status]}</h3>
+    <p><strong>Summary:</strong> {summary}</p>
+    <div id="pypi-details">{pypi_details}</div>
+    <p><a href="https://pypi.org/project/{package_name}/" target="_blank">PyPI page</a> 📦 | <a href="https://pypistats.org/packages/{package_name}" target="_blank">PyPI stats</a> 📈</p>
+    <hr />
+    <div id="package-notes">{notes_html}</div>
+    </div>"""
+    body = f'<body data-package="{package_name}" data-status="{status}"'
+    if fill:
+        body += f' data-fill="{" ".join(fill)}"'
+    replacements = [
+        (
+            "<title>📦 PyScript Packages</title>",
+            f"<title>📦 {package_name} - PyScript Packages</title>",
+        ),
+        ("<body>", body + ">"),
+        (
+            '<p class="loading-text" id="loading-text">Loading package information...</p>',
+            "",
+        ),
+        ('<div id="metadata"></div>', metadata),
+    ]
+    for old, new in replacements:
+        if old not in template:
+            raise ValueError(f"{PACKAGE_PAGE} has no {old}")
+        template = template.replace(old, new, 1)
+    return template
+
+
+def status_badge(status):
+    """
+    Return the HTML for the badge of the given status.
+    """
+    if status == "green":
+        return '<span class="status-badge green">✅</span>'
+    elif status == "amber":
+        return '<span class="status-badge amber">⚠️</span>'
+    return '<span class="status-badge red">❌</span>'
+
+
+def top_package_item(pkg):
+    """
+    Return the HTML for the item in the list of top packages on the home
+    page of the given package. The name and summary come from PyPI, so are
+    escaped. This must match the implementation in home.py.
+    """
+    status = pkg.get("status", "unknown")
+    name = escape(pkg["package_name"])
+    return f"""<a href="{package_page_url(name)}" class="package-item status-{status}">
+  <div class="package-header">
+    <span class="package-name">{name}</span>
+    {status_badge(status)}
+  </div>
+  <p class="package-desc">{escape(pkg["summary"] or "")}</p>
+</a>"""
+
+
+def build_static_pages(all_packages, top_packages):
+    """
+    Prerender a page for every known package (and every top package), and
+    the first 100 of the top packages into the home page, so both show
+    their content straight away, without waiting for PyScript to start.
+    PyScript then only hydrates the interactive parts of them.
+
+    The package pages go in the /package/ directory as <package_name>.html,
+    alongside the package page they're rendered from. The home page's list
+    goes between its <!-- top100 --> and <!-- /top100 --> markers.
+
+    Returns the package pages, mapping each filename to its content. If the
+    pages to render from aren't there (the build isn't being run from the
+    root of the site), nothing is prerendered.
+    """
+    missing = [
+        filename
+        for filename in (PACKAGE_PAGE, HOME_PAGE)
+        if not os.path.exists(filename)
+    ]
+    if missing:
+        log.warning(
+            "Not prerendering the pages, since %s can't be found. Run this "
+            "from the root of the site.",
+            " and ".join(missing),
+        )
+        return {}
+    with open(PACKAGE_PAGE, "r") as f:
+        template = f.read()
+    count("files_read")
+    package_dir = os.path.dirname(PACKAGE_PAGE)
+    pages = {}
+    for pkg in top_packages:
+        # Top packages we have no support data for.
+        pages[pkg["package_name"]] = {
+            "status": "amber",
+            "summary": pkg["summary"],
+            "notes_html": NO_DATA_NOTES_HTML,
+        }
+    pages.update(all_packages)
+    outputs = {}
+    for package_name, data in pages.items():
+        if package_name == "index":
+            continue
+        filename = os.path.join(package_dir, f"{package_name}.html")
+        outputs[filename] = package_page(template, package_name, data)
+    if not build_output.dry_run:
+        for entry in os.scandir(package_dir):
+            if (
+                entry.name.endswith(".html")
+                and entry.path != PACKAGE_PAGE
+                and entry.path not in outputs
+            ):
+                # Packages we no longer know about.
+                os.remove(entry.path)
+    written = 0
+    for filename, content in outputs.items():
+        written += write_if_changed(filename, content)
+
+    with open(HOME_PAGE, "r") as f:
+        home_page = f.read()
+    count("files_read")
+    start = home_page.index("<!-- top100 -->") + len("<!-- top100 -->")
+    end = home_page.index("<!-- /top100 -->")
+    items = "".join(top_package_item(pkg) for pkg in top_packages[:100])
+    write_if_changed(HOME_PAGE, home_page[:start] + items + home_page[end:])
+    log.info(
+        "Prerendered %d package pages (%d changed) and the top %d packages "
+        "on the home page",
+        len(outputs),
+        written,
+        len(top_packages[:100]),
+    )
+    return outputs
@@ -0,0 +1,89 @@
+"""
+The Pyodide releases the package support data covers, and the PyScript
+releases that use them.
+
+When a new version of PyScript is released, add it (and the Pyodide release
+it uses) to PYSCRIPT_PYODIDE_MAP.
+"""
+
+
+PYSCRIPT_PYODIDE_MAP = {
+  "2024.10.1": "0.26.2",
+  "2024.10.2": "0.26.3",
+  "2024.11.1": "0.26.4",
+  "2025.2.1": "0.26.4",
+  "2025.2.2": "0.27.2",
+  "2025.2.3": "0.27.2",
+  "2025.2.4": "0.27.2",
+  "2025.3.1": "0.27.3",
+  "2025.5.1": "0.27.6",
+  "2025.7.1": "0.27.7",
+  "2025.7.2": "0.27.7",
+  "2025.7.3": "0.27.7",
+  "2025.8.1": "0.28.1",
+  "2025.10.1": "0.29.0",
+  "2025.10.2": "0.29.0",
+  "2025.10.3": "0.29.0",
+  "2025.11.1": "0.29.0",
+  "2026.1.1": "0.29.1",
+}
+
+
+def release_key(release):
+    """
+    Sort key for a Pyodide (or PyScript) release version string such as
+    "0.29.1", so that releases sort by version rather than alphabetically.
+    """
+    return tuple(int(part) if part.isdigit() else 0 for part in release.split("."))
+
+
+class ReleaseIndex:
+    """
+    The Pyodide releases in the package support data, in version order.
+
+    Built once per run, so everything else can work with each release's
+    ordinal (its position in that order) rather than comparing version
+    strings. It also maps each Pyodide release to all the PyScript releases
+    that use it (oldest first), since several PyScript releases may share
+    the same version of Pyodide.
+    """
+
+    def __init__(self, releases):
+        self.releases = sorted(
+            (release for release in releases if release not in {"latest", "stable"}),
+            key=release_key,
+        )
+        self.ordinals = {
+            release: ordinal for ordinal, release in enumerate(self.releases)
+        }
+        self.latest = self.releases[-1] if self.releases else None
+        self.pyscript_releases = {}
+        for pyscript_release in sorted(PYSCRIPT_PYODIDE_MAP, key=release_key):
+            self.pyscript_releases.setdefault(
+                PYSCRIPT_PYODIDE_MAP[pyscript_release], []
+            ).append(pyscript_release)
+        # The newest PyScript release using each Pyodide release, by ordinal.
+        self.pyscript_versions = [
+            self.pyscript_releases.get(release, ["unknown"])[-1]
+            for release in self.releases
+        ]
+
+    def pyscript_version(self, release):
+        """
+        The newest PyScript release that uses the given Pyodide release, or
+        "unknown".
+        """
+        ordinal = self.ordinals.get(release)
+        if ordinal is None:
+            return "unknown"
+        return self.pyscript_versions[ordinal]
+
+    def newest_first(self, releases):
+        """
+        Return the given releases sorted from newest to oldest.
+        """
+        return sorted(
+            releases,
+            key=lambda release: self.ordinals.get(release, -1),
+            reverse=True,
+        )
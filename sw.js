@@ -0,0 +1,214 @@
+/*
+ * The service worker of the PyScript Packages site.
+ *
+ * It makes repeat (and offline) visits load straight from the browser's
+ * caches, and only refetches what has changed after the data is rebuilt:
+ *
+ * - The pinned PyScript release (and other version pinned files from CDNs)
+ *   never change, so they're served cache first.
+ * - The data files and prerendered package pages generated by build_data.py
+ *   are listed, with a hash of their content, in api/precache.json (whose
+ *   version is the `last_run` of the build). Each is cached under its hash,
+ *   so it's served from the cache until its content changes, and only then
+ *   fetched again.
+ * - Everything else from the site (the pages, scripts and styles) is served
+ *   stale while revalidating: straight from the cache, while the cache is
+ *   updated in the background for next time.
+ * - api/last_run.json and api/precache.json always come from the network
+ *   (if it's there), since they say what's current. Whenever last_run.json
+ *   reveals a new build, the new manifest is fetched before anything else.
+ *
+ * The site shell, the most used data files and the PyScript runtime are
+ * precached when the service worker is installed.
+ */
+
+const SCOPE = self.registration.scope;
+const MANIFEST_URL = new URL("api/precache.json", SCOPE).href;
+const LAST_RUN_URL = new URL("api/last_run.json", SCOPE).href;
+
+// The cache of the site and data files, and of the pinned runtime.
+const SITE_CACHE = "pyscript-packages-site";
+const RUNTIME_CACHE = "pyscript-packages-runtime";
+
+// The current manifest, loaded from the cache (or network) when needed.
+let manifest = null;
+
+/*
+ * Return true if the URL is of a file that never changes: part of a pinned
+ * PyScript release, or a version pinned file from jsDelivr.
+ */
+function isPinned(url) {
+    return (
+        url.startsWith("https://pyscript.net/releases/") ||
+        (url.startsWith("https://cdn.jsdelivr.net/npm/") && /@\d/.test(url))
+    );
+}
+
+/*
+ * Return the cache key of the site file at the URL: the URL itself, plus
+ * the hash of its content if it's in the manifest. Query strings don't
+ * change which file is served, so they're ignored.
+ */
+function cacheKey(url) {
+    const path = url.split(/[?#]/)[0];
+    const hash = manifest && manifest.files[path.slice(SCOPE.length)];
+    return hash ? `${path}?v=${hash}` : path;
+}
+
+/*
+ * Load the manifest from the cache, if it isn't loaded already.
+ */
+async function loadManifest() {
+    if (!manifest) {
+        const cache = await caches.open(SITE_CACHE);
+        const response = await cache.match(MANIFEST_URL);
+        if (response) {
+            manifest = await response.json();
+        }
+    }
+    return manifest;
+}
+
+/*
+ * Fetch the latest manifest. If it's for a new build, cache it, remove the
+ * cached versions of the data files that have changed since, and precache
+ * the files the manifest says to.
+ */
+async function updateManifest() {
+    await loadManifest();
+    let response;
+    try {
+        response = await fetch(MANIFEST_URL, { cache: "no-cache" });
+    } catch (error) {
+        return;
+    }
+    if (!response.ok) {
+        return;
+    }
+    const latest = await response.clone().json();
+    if (manifest && manifest.version === latest.version) {
+        return;
+    }
+    const cache = await caches.open(SITE_CACHE);
+    await cache.put(MANIFEST_URL, response);
+    manifest = latest;
+    for (const request of await cache.keys()) {
+        const url = request.url;
+        if (url.includes("?v=") && cacheKey(url) !== url) {
+            await cache.delete(request);
+        }
+    }
+    await precache();
+}
+
+/*
+ * Cache the files the manifest says to precache, and the runtime.
+ */
+async function precache() {
+    const site = await caches.open(SITE_CACHE);
+    for (const path of manifest.precache) {
+        const url = new URL(path, SCOPE).href;
+        const key = cacheKey(url);
+        if (!(await site.match(key))) {
+            await fetchAndCache(url, site, key).catch(() => null);
+        }
+    }
+    const runtime = await caches.open(RUNTIME_CACHE);
+    for (const url of manifest.runtime) {
+        if (!(await runtime.match(url))) {
+            await fetchAndCache(url, runtime, url).catch(() => null);
+        }
+    }
+}
+
+/*
+ * Fetch the request and, if that worked, cache the response under the key.
+ */
+async function fetchAndCache(request, cache, key) {
+    const response = await fetch(request);
+    if (response.ok) {
+        await cache.put(key, response.clone());
+    }
+    return response;
+}
+
+/*
+ * Serve a file that never changes from the cache, or fetch and cache it.
+ */
+async function cacheFirst(request) {
+    const cache = await caches.open(RUNTIME_CACHE);
+    const cached = await cache.match(request);
+    return cached || fetchAndCache(request, cache, request);
+}
+
+/*
+ * Serve one of the files that say what's current from the network, falling
+ * back to the cache when offline. A new last_run means a new build, so the
+ * new manifest is fetched before carrying on.
+ */
+async function networkFirst(request) {
+    const cache = await caches.open(SITE_CACHE);
+    const key = request.url.split(/[?#]/)[0];
+    let response;
+    try {
+        response = await fetchAndCache(request, cache, key);
+    } catch (error) {
+        return (await cache.match(key)) || Response.error();
+    }
+    if (key === LAST_RUN_URL && response.ok) {
+        const lastRun = (await response.clone().json()).last_run;
+        await loadManifest();
+        if (!manifest || manifest.version !== lastRun) {
+            await updateManifest();
+        }
+    }
+    return response;
+}
+
+/*
+ * Serve a file from the site: from the cache under its hash if it's in
+ * the manifest (fetching it only if it isn't cached yet), otherwise stale
+ * while revalidating.
+ */
+async function fromSite(event) {
+    await loadManifest();
+    const request = event.request;
+    const key = cacheKey(request.url);
+    const cache = await caches.open(SITE_CACHE);
+    const cached = await cache.match(key);
+    if (key.includes("?v=")) {
+        return cached || fetchAndCache(request, cache, key);
+    }
+    const refresh = fetchAndCache(request, cache, key);
+    if (cached) {
+        event.waitUntil(refresh.catch(() => null));
+        return cached;
+    }
+    return refresh;
+}
+
+self.addEventListener("install", (event) => {
+    event.waitUntil(updateManifest().then(() => self.skipWaiting()));
+});
+
+self.addEventListener("activate", (event) => {
+    event.waitUntil(self.clients.claim());
+});
+
+self.addEventListener("fetch", (event) => {
+    const request = event.request;
+    if (request.method !== "GET") {
+        return;
+    }
+    const url = request.url;
+    if (isPinned(url)) {
+        event.respondWith(cacheFirst(request));
+    } else if (!url.startsWith(SCOPE)) {
+        // Anything else from elsewhere (e.g. PyPI) is left to the browser.
+        return;
+    } else if ([MANIFEST_URL, LAST_RUN_URL].includes(url.split(/[?#]/)[0])) {
+        event.respondWith(networkFirst(request));
+    } else {
+        event.respondWith(fromSite(event));
+    }
+});
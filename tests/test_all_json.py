@@ -0,0 +1,105 @@
+"""
+Tests for generating all.json incrementally, by patching only the package
+files that have changed since the last build into it.
+"""
+import json
+
+import pytest
+
+import build_data
+import build_log
+import package_store
+
+
+@pytest.fixture
+def package_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    build_data.configure(["-q"])
+    path = tmp_path / "api" / "package"
+    path.mkdir(parents=True)
+    return path
+
+
+def write_record(package_dir, package_name, record):
+    (package_dir / f"{package_name}.json").write_text(json.dumps(record))
+
+
+def build(package_dir):
+    """
+    Build all.json, returning what it holds and how many files were read.
+    """
+    build_log.stats.clear()
+    build_data.build_all_json(package_store.PackageStore(str(package_dir)))
+    all_json = json.loads((package_dir.parent / "all.json").read_text())
+    return all_json, build_log.stats["setup"]["files_read"]
+
+
+def test_all_json_patches_changes(package_dir):
+    """
+    Only the package files changed since the last build are read, and the
+    changes (including added and removed files) are patched into all.json.
+    """
+    write_record(package_dir, "numpy", {"status": "green"})
+    write_record(package_dir, "arrr", {"status": "red"})
+    write_record(package_dir, "pandas", {"status": "green"})
+    all_json, _ = build(package_dir)
+    assert list(all_json) == ["arrr", "numpy", "pandas"]
+
+    write_record(package_dir, "numpy", {"status": "amber", "notes": "Hmm."})
+    write_record(package_dir, "jinja2", {"status": "green"})
+    (package_dir / "arrr.json").unlink()
+    all_json, files_read = build(package_dir)
+    assert all_json == {
+        "jinja2": {"status": "green"},
+        "numpy": {"status": "amber", "notes": "Hmm."},
+        "pandas": {"status": "green"},
+    }
+    # The manifest, all.json and the two changed package files.
+    assert files_read == 4
+
+
+def test_all_json_nothing_changed(package_dir):
+    write_record(package_dir, "numpy", {"status": "green"})
+    build(package_dir)
+    mtime = (package_dir.parent / "all.json").stat().st_mtime_ns
+    all_json, files_read = build(package_dir)
+    assert all_json == {"numpy": {"status": "green"}}
+    assert files_read == 2
+    assert (package_dir.parent / "all.json").stat().st_mtime_ns == mtime
+
+
+def test_all_json_uses_the_records_written(package_dir):
+    """
+    Records just written by the package store are taken from memory rather
+    than read back.
+    """
+    write_record(package_dir, "numpy", {"status": "green"})
+    build(package_dir)
+    store = package_store.PackageStore(str(package_dir))
+    store.put("numpy", {"status": "red"})
+    store.put("arrr", {"status": "green"})
+    store.flush()
+    build_log.stats.clear()
+    all_packages, digests = build_data.build_all_json(store)
+    assert all_packages == {
+        "arrr": {"status": "green"},
+        "numpy": {"status": "red"},
+    }
+    assert digests["numpy"] == store.written["numpy"]
+    assert build_log.stats["setup"]["files_read"] == 2
+
+
+def test_all_json_rebuilt_when_edited(package_dir):
+    """
+    If all.json was changed by something else, it's rebuilt from scratch.
+    """
+    write_record(package_dir, "numpy", {"status": "green"})
+    build(package_dir)
+    (package_dir.parent / "all.json").write_text('{"bogus": {}}')
+    all_json, _ = build(package_dir)
+    assert all_json == {"numpy": {"status": "green"}}
+
+
+def test_all_json_no_packages(package_dir):
+    all_json, _ = build(package_dir)
+    assert all_json == {}
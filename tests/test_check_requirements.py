@@ -0,0 +1,186 @@
+"""
+Tests for the requirements checker (check_requirements.py).
+"""
+import pytest
+
+import check_requirements
+
+
+@pytest.mark.parametrize(
+    "version, specifier, expected",
+    [
+        ("2.2.5", "", True),
+        ("2.2.5", ">=1.26,<3", True),
+        ("3.0", ">=1.26,<3", False),
+        ("1.26", ">=1.26", True),
+        ("1.25.9", ">=1.26", False),
+        ("2.0", "==2", True),
+        ("2.0.1", "==2.*", True),
+        ("3.0", "==2.*", False),
+        ("3.0", "!=2.*", True),
+        ("2.1", "!=2.1", False),
+        ("1.4.2", "~=1.4", True),
+        ("2.0", "~=1.4", False),
+        ("1.4.5", "~=1.4.2", True),
+        ("1.5.0", "~=1.4.2", False),
+        ("1.0", ">1.0", False),
+        ("1.0", "<=1.0", True),
+        ("1.0rc1", ">=1.0", False),
+        ("2.0.dev1", ">=2.0", False),
+        ("2.0rc1", "<2.0", True),
+        ("1.0a1", "<1.0b1", True),
+        ("1.0.dev1", "<1.0a1", True),
+        ("1.0rc1.dev1", "<1.0rc1", True),
+        ("1.0.post1", ">1.0", True),
+        ("1.0.post1.dev1", "<1.0.post1", True),
+        ("2.0rc1", "==2.*", True),
+        ("1.4.2rc1", "~=1.4.2", False),
+        ("1.0+local", "===1.0+local", True),
+        ("1.0", "===1.0+local", False),
+    ],
+)
+def test_satisfies(version, specifier, expected):
+    assert check_requirements.satisfies(version, specifier) is expected
+
+
+def test_parse_requirement():
+    parse = check_requirements.parse_requirement
+    assert parse("numpy[extra]>=1.26, <3 ; python_version > '3.8'") == (
+        "numpy",
+        ">=1.26,<3",
+    )
+    assert parse("pandas (>=2)") == ("pandas", ">=2")
+    assert parse("arrr @ https://example.com/arrr.whl") == ("arrr", "")
+    assert parse("-r other.txt") is None
+    assert parse("https://example.com/arrr.whl") is None
+
+
+def test_parse_requirements_txt():
+    text = """# A comment.
+numpy>=1.26  # Inline comment.
+-e .
+pandas \\
+    ==2.2.*
+"""
+    assert check_requirements.parse_requirements_txt(text) == [
+        ("numpy", ">=1.26"),
+        ("pandas", "==2.2.*"),
+    ]
+
+
+def test_parse_pyproject():
+    text = """[build-system]
+requires = ["setuptools>=61"]
+
+[project]
+name = "example"
+dependencies = [
+    "numpy>=1.26",  # A comment, with a "quote".
+    'pandas[excel]',
+    "arrr; python_version>'3.8'"]
+version = "1.0"
+
+[project.optional-dependencies]
+test = ["pytest>=8", "pytest-cov"]
+docs = [
+    "sphinx",
+]
+
+[tool.example]
+dependencies = ["not-a-dependency"]
+"""
+    assert check_requirements.parse_pyproject(text) == [
+        ("numpy", ">=1.26"),
+        ("pandas", ""),
+        ("arrr", ""),
+        ("pytest", ">=8"),
+        ("pytest-cov", ""),
+        ("sphinx", ""),
+    ]
+    assert check_requirements.parse(text) == check_requirements.parse_pyproject(
+        text
+    )
+
+
+def test_normalize_name():
+    assert check_requirements.normalize_name(" Ruamel__.YAML ") == "ruamel-yaml"
+
+
+LOOKUP = {
+    "releases": ["0.27.7", "0.28.1", "0.29.1", "0.29.2"],
+    "pyscript_versions": ["2025.7.3", "2025.8.1", "2026.1.1", "unknown"],
+    "versions": ["1.26.4", "2.0.2", "2.2.5", "2.2.3", "2.3.0"],
+    "packages": {
+        "numpy": ["numpy", "green", [1, 2, 3, 3]],
+        "pandas": ["pandas", "green", [0, 4, 4, 5]],
+        "arrr": ["arrr", "green", []],
+        "nope": ["nope", "red", []],
+    },
+}
+
+
+def test_check_newest_release():
+    """
+    The newest release used by PyScript is preferred, with any newer one
+    that isn't noted separately.
+    """
+    result = check_requirements.check([("NumPy", ""), ("arrr", "")], LOOKUP)
+    assert result["release"] == "0.29.1"
+    assert result["pyscript_version"] == "2026.1.1"
+    assert result["pyodide_only_release"] == "0.29.2"
+    assert result["status"] == "green"
+    assert [package["ok"] for package in result["packages"]] == [True, True]
+    assert result["packages"][0]["version"] == "2.2.5"
+    assert result["packages"][1]["in_pyodide"] is False
+
+
+def test_check_picks_a_release_satisfying_all():
+    result = check_requirements.check([("numpy", "<2"), ("pandas", "")], LOOKUP)
+    # numpy<2 is only in the oldest release, where there's no pandas.
+    assert result["release"] == "0.29.1"
+    assert result["status"] == "red"
+    assert [package["ok"] for package in result["packages"]] == [False, True]
+    result = check_requirements.check([("numpy", "<2.1")], LOOKUP)
+    assert result["release"] == "0.28.1"
+    assert result["packages"][0]["version"] == "2.0.2"
+    assert result["pyodide_only_release"] is None
+
+
+def test_check_only_pyodide_satisfies():
+    """
+    If only a release PyScript doesn't use satisfies a requirement, the
+    best release PyScript uses is still picked, and that one is noted.
+    """
+    result = check_requirements.check([("pandas", ">=2.3")], LOOKUP)
+    assert result["release"] == "0.29.1"
+    assert result["packages"][0]["ok"] is False
+    assert result["pyodide_only_release"] == "0.29.2"
+
+
+def test_check_without_pyscript_releases():
+    lookup = dict(LOOKUP, pyscript_versions=["unknown"] * 4)
+    result = check_requirements.check([("numpy", "")], lookup)
+    assert result["release"] == "0.29.2"
+    assert result["pyscript_version"] == "unknown"
+    assert result["pyodide_only_release"] is None
+
+
+def test_check_unknown_and_red():
+    result = check_requirements.check([("nope", ""), ("mystery", "")], LOOKUP)
+    assert result["status"] == "red"
+    assert [package["status"] for package in result["packages"]] == [
+        "red",
+        "unknown",
+    ]
+    assert not any(package["ok"] for package in result["packages"])
+
+
+def test_main_without_lookup(tmp_path, capsys):
+    requirements = tmp_path / "requirements.txt"
+    requirements.write_text("numpy\n")
+    with pytest.raises(SystemExit) as exit_info:
+        check_requirements.main(
+            [str(requirements), "--lookup", str(tmp_path / "lookup.json")]
+        )
+    assert exit_info.value.code == 2
+    assert "Run build_data.py first" in capsys.readouterr().err
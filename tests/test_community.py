@@ -0,0 +1,204 @@
+"""
+Tests for reading the community contributed updates from the CSV of form
+responses, and the high water mark that lets later runs skip the rows
+already processed.
+"""
+import contextlib
+import datetime
+import io
+import json
+
+import pytest
+
+import build_data
+import package_store
+
+
+HEADER = (
+    'Timestamp,"Package name (e.g. pandas, numba, my-cool-lib)",'
+    "Suggested status,Comments about status (Markdown allowed)\r\n"
+)
+EPOCH = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def row(timestamp, package_name, status, comments=""):
+    return f'{timestamp},{package_name},{status},"{comments}"\r\n'
+
+
+def sheet(*rows):
+    return (HEADER + "".join(rows)).encode("utf-8")
+
+
+@pytest.fixture(autouse=True)
+def setup(monkeypatch):
+    build_data.configure(["-q"])
+
+
+def test_read_community_updates():
+    """
+    The latest update for each package is returned, keyed by normalized name.
+    """
+    csv_file = io.BytesIO(
+        sheet(
+            row("01/02/2025 10:00:00", "NumPy", "Green"),
+            row("02/02/2025 10:00:00", "arrr", "Red"),
+            row("03/02/2025 10:00:00", "numpy", "Amber"),
+        )
+    )
+    updates, high_water_mark, _ = build_data.read_community_updates(
+        csv_file, {}, EPOCH
+    )
+    assert sorted(updates) == ["arrr", "numpy"]
+    assert updates["numpy"][1]["Suggested status"] == "Amber"
+    assert high_water_mark["offset"] == len(csv_file.getvalue())
+
+
+def test_read_community_updates_skips_processed_rows():
+    """
+    With a high water mark from a previous run, the rows before it are not
+    read at all: only the rows appended since are.
+    """
+    first = sheet(
+        row("01/02/2025 10:00:00", "numpy", "Green"),
+        row("02/02/2025 09:00:00", "pandas", "Green"),
+    )
+    _, high_water_mark, _ = build_data.read_community_updates(
+        io.BytesIO(first), {}, EPOCH
+    )
+    appended = row("02/02/2025 10:00:00", "arrr", "Red")
+    # Garble the rows already processed (but not the last of them), to show
+    # they're skipped.
+    garbled = first.replace(b"01/02/2025", b"not a date", 1)
+    updates, new_high_water_mark, _ = build_data.read_community_updates(
+        io.BytesIO(garbled + appended.encode("utf-8")), high_water_mark, EPOCH
+    )
+    assert sorted(updates) == ["arrr"]
+    assert new_high_water_mark["offset"] == len(garbled) + len(appended)
+
+
+def test_read_community_updates_rereads_a_changed_sheet():
+    """
+    If the last row processed isn't where it was, the whole sheet is read.
+    """
+    first = sheet(row("01/02/2025 10:00:00", "numpy", "Green"))
+    _, high_water_mark, _ = build_data.read_community_updates(
+        io.BytesIO(first), {}, EPOCH
+    )
+    changed = sheet(
+        row("01/02/2025 10:00:00", "pandas", "Green"),
+        row("02/02/2025 10:00:00", "arrr", "Red"),
+    )
+    updates, _, _ = build_data.read_community_updates(
+        io.BytesIO(changed), high_water_mark, EPOCH
+    )
+    assert sorted(updates) == ["arrr", "pandas"]
+
+
+def test_read_community_updates_nothing_new():
+    """
+    When no rows are read, the high water mark is left as it was.
+    """
+    first = sheet(row("01/02/2025 10:00:00", "numpy", "Green"))
+    _, high_water_mark, _ = build_data.read_community_updates(
+        io.BytesIO(first), {}, EPOCH
+    )
+    updates, same, newest = build_data.read_community_updates(
+        io.BytesIO(first), high_water_mark, EPOCH
+    )
+    assert updates == {}
+    assert same == high_water_mark
+    assert newest is None
+
+
+def serve_sheet(monkeypatch, rows):
+    """
+    Serve a sheet of the given rows (a list, which can be appended to
+    between runs) in place of the published CSV.
+    """
+    monkeypatch.setattr(
+        build_data,
+        "http_open",
+        lambda url, revalidate=False: contextlib.closing(
+            io.BytesIO(sheet(*rows))
+        ),
+    )
+    monkeypatch.setattr(build_data, "fetch_pypi_metadata", lambda names: {})
+
+
+def test_update_from_community_cutoff(tmp_path, monkeypatch):
+    """
+    The cutoff recorded for the next run is the timestamp of the newest
+    update read, so updates submitted after the sheet was fetched are
+    applied by the next run. When there's nothing new, it's left as it was.
+    """
+    rows = [row("01/02/2025 10:00:00", "numpy", "Green")]
+    serve_sheet(monkeypatch, rows)
+    store = package_store.PackageStore(str(tmp_path))
+    first = build_data.update_from_community(store, {})
+    assert first["last_run"] == "2025-02-01T10:00:00+00:00"
+    rows.append(row("01/02/2025 10:30:00", "arrr", "Red"))
+    second = build_data.update_from_community(
+        store, {"community_updates": first}
+    )
+    assert store.get("arrr")["status"] == "red"
+    assert second["last_run"] == "2025-02-01T10:30:00+00:00"
+    third = build_data.update_from_community(
+        store, {"community_updates": second}
+    )
+    assert third == second
+
+
+def test_update_from_community_old_last_run(tmp_path, monkeypatch):
+    """
+    Older builds only recorded when the whole script was last run, which is
+    taken as the cutoff.
+    """
+    serve_sheet(
+        monkeypatch,
+        [
+            row("01/02/2025 10:00:00", "numpy", "Green"),
+            row("01/03/2025 10:00:00", "arrr", "Red"),
+        ],
+    )
+    store = package_store.PackageStore(str(tmp_path))
+    record = build_data.update_from_community(
+        store, {"last_run": "2025-02-15T00:00:00+00:00"}
+    )
+    assert store.get("numpy") is None
+    assert store.get("arrr")["status"] == "red"
+    assert record["last_run"] == "2025-03-01T10:00:00+00:00"
+
+
+def test_update_from_community_offline(tmp_path, monkeypatch):
+    """
+    Offline, the updates in the cached sheet are applied, but the cutoff
+    isn't moved on, since the sheet may be out of date.
+    """
+    serve_sheet(monkeypatch, [row("01/02/2025 10:00:00", "numpy", "Green")])
+    build_data.configure(["-q", "--offline"])
+    store = package_store.PackageStore(str(tmp_path))
+    record = build_data.update_from_community(
+        store, {"last_run": "2025-01-15T00:00:00+00:00"}
+    )
+    assert store.get("numpy")["status"] == "green"
+    assert record == {"last_run": "2025-01-15T00:00:00+00:00"}
+
+
+def test_other_stages_keep_the_cutoff(tmp_path, monkeypatch):
+    """
+    A run without the community stage carries the cutoff over (including
+    that of older builds, which only recorded when the script was last
+    run), so no community updates are skipped by the next run.
+    """
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "api" / "package").mkdir(parents=True)
+    (tmp_path / "api" / "package" / "numpy.json").write_text("{}")
+    (tmp_path / "api" / "last_run.json").write_text(
+        '{"last_run": "2026-01-21T11:59:57.895089+00:00"}'
+    )
+    build_data.main(["-q", "--offline", "--stage", "aggregate"])
+    last_run_data = json.loads((tmp_path / "api" / "last_run.json").read_text())
+    assert last_run_data["community_updates"] == {
+        "last_run": "2026-01-21T11:59:57.895089+00:00"
+    }
+    assert last_run_data["last_run"] != "2026-01-21T11:59:57.895089+00:00"
@@ -0,0 +1,214 @@
+"""
+Tests for the concurrent, rate limited and cached fetching of PyPI metadata
+in build_http.py, against a local stand-in for the PyPI JSON API.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import build_data
+import build_http
+import package_store
+
+
+class StandIn:
+    """
+    A local stand-in for the PyPI JSON API. Each package's metadata is
+    served from /<package_name>/json with an ETag, after first failing with
+    a 503 as many times as asked. It records the requests made, and the most
+    requests it ever had in flight at once.
+    """
+
+    def __init__(self, packages, failures=None, delay=0):
+        self.packages = packages
+        self.failures = dict(failures or {})
+        self.delay = delay
+        self.requests = []
+        self.statuses = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def handle(self, handler):
+        package_name = handler.path.strip("/").split("/")[0]
+        with self.lock:
+            self.requests.append(handler.path)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            with self.lock:
+                failures = self.failures.get(package_name, 0)
+                self.failures[package_name] = failures - 1
+            if failures > 0:
+                status, body = 503, b""
+            elif package_name not in self.packages:
+                status, body = 404, b"Not Found"
+            else:
+                body = json.dumps(self.packages[package_name]).encode("utf-8")
+                etag = f'"{package_name}"'
+                if handler.headers.get("If-None-Match") == etag:
+                    status, body = 304, b""
+                else:
+                    status = 200
+            with self.lock:
+                self.statuses.append(status)
+            handler.send_response(status)
+            if status in (200, 304):
+                handler.send_header("ETag", f'"{package_name}"')
+            handler.send_header("Content-Length", str(len(body)))
+            handler.end_headers()
+            handler.wfile.write(body)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+def metadata(package_name):
+    return {"info": {"name": package_name, "summary": f"The {package_name}."}}
+
+
+@pytest.fixture
+def serve(tmp_path, monkeypatch):
+    """
+    Return a function that starts a stand-in server and sets build_data up
+    to fetch from it (with the HTTP cache in a temporary directory).
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(build_http, "RETRY_BACKOFF", 0.01)
+    servers = []
+
+    def serve(stand_in, *arguments):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stand_in.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        build_data.configure(
+            ["--pypi-url", url, "--rate-limit", "0", *arguments]
+        )
+        build_http.setup_http(build_data.args)
+        return url
+
+    yield serve
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_fetch_pypi_metadata(serve):
+    """
+    The metadata of every package is fetched, keyed by package name.
+    """
+    names = ["numpy", "pandas", "arrr"]
+    serve(StandIn({name: metadata(name) for name in names}))
+    result = build_http.fetch_pypi_metadata(names)
+    assert result == {name: metadata(name) for name in names}
+
+
+def test_fetch_pypi_metadata_concurrency_limit(serve):
+    """
+    Requests are made concurrently, but never more than --concurrency at once.
+    """
+    names = [f"package-{number}" for number in range(24)]
+    stand_in = StandIn({name: metadata(name) for name in names}, delay=0.05)
+    serve(stand_in, "--concurrency", "4")
+    result = build_http.fetch_pypi_metadata(names)
+    assert len(result) == len(names)
+    assert 1 < stand_in.max_in_flight <= 4
+
+
+def test_fetch_pypi_metadata_missing_package(serve):
+    """
+    Unknown packages have None as their metadata, and the 404 is cached so
+    they're not asked for again.
+    """
+    stand_in = StandIn({"numpy": metadata("numpy")})
+    serve(stand_in)
+    result = build_http.fetch_pypi_metadata(["numpy", "no-such-package"])
+    assert result == {"numpy": metadata("numpy"), "no-such-package": None}
+    assert build_http.fetch_pypi_metadata(["no-such-package"]) == {
+        "no-such-package": None
+    }
+    assert stand_in.requests.count("/no-such-package/json") == 1
+
+
+def test_http_get_retries_transient_errors(serve):
+    """
+    Transient errors are retried (with backoff) until they succeed.
+    """
+    stand_in = StandIn({"numpy": metadata("numpy")}, failures={"numpy": 2})
+    url = serve(stand_in, "--retries", "3")
+    response = build_http.http_get(f"{url}/numpy/json")
+    assert response.status_code == 200
+    assert response.json() == metadata("numpy")
+    assert stand_in.statuses == [503, 503, 200]
+
+
+def test_http_get_gives_up_after_retries(serve):
+    """
+    Once the retries are used up, the last response is returned, and the
+    package's metadata is None.
+    """
+    stand_in = StandIn({"numpy": metadata("numpy")}, failures={"numpy": 10})
+    url = serve(stand_in, "--retries", "2")
+    assert build_http.http_get(f"{url}/numpy/json").status_code == 503
+    assert stand_in.statuses == [503, 503, 503]
+    assert build_http.fetch_pypi_metadata(["numpy"]) == {"numpy": None}
+
+
+def test_http_get_revalidates_with_etag(serve):
+    """
+    Fresh responses are served from the cache without a request, and stale
+    ones are revalidated with If-None-Match (and a 304 served from the cache).
+    """
+    stand_in = StandIn({"numpy": metadata("numpy")})
+    url = serve(stand_in)
+    build_http.http_get(f"{url}/numpy/json")
+    assert build_http.http_get(f"{url}/numpy/json").json() == metadata("numpy")
+    assert stand_in.statuses == [200]
+    build_http.http_cache.ttl = 0
+    response = build_http.http_get(f"{url}/numpy/json")
+    assert response.status_code == 200
+    assert response.json() == metadata("numpy")
+    assert stand_in.statuses == [200, 304]
+
+
+def test_http_get_revalidate(serve):
+    """
+    When asked to, even a fresh response is revalidated (the community
+    updates sheet always is).
+    """
+    stand_in = StandIn({"numpy": metadata("numpy")})
+    url = serve(stand_in)
+    build_http.http_get(f"{url}/numpy/json")
+    response = build_http.http_get(f"{url}/numpy/json", revalidate=True)
+    assert response.json() == metadata("numpy")
+    assert stand_in.statuses == [200, 304]
+
+
+def test_refresh_pypi(serve, tmp_path):
+    """
+    Every package's PyPI details are refreshed, and only those that have
+    changed are rewritten.
+    """
+    names = ["numpy", "arrr"]
+    serve(StandIn({name: metadata(name) for name in names}))
+    package_dir = tmp_path / "api" / "package"
+    package_dir.mkdir(parents=True)
+    store = package_store.PackageStore(str(package_dir))
+    store.put("numpy", {"status": "green"})
+    store.put("arrr", {"pypi": build_http.pypi_subset(metadata("arrr"))})
+    store.flush()
+    build_data.refresh_pypi(store)
+    assert sorted(store.dirty) == ["numpy"]
+    assert store.get("numpy")["pypi"]["summary"] == "The numpy."
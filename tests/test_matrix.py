@@ -0,0 +1,101 @@
+"""
+Tests for the support matrix of packages × Pyodide releases, in
+matrix.json and the NumPy array file matrix.npy.
+"""
+import ast
+import io
+import json
+from array import array
+
+import pytest
+
+import build_data
+import build_output
+
+
+@pytest.fixture
+def api_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    build_data.configure(["-q"])
+    path = tmp_path / "api"
+    path.mkdir()
+    return path
+
+
+def read_npy(content):
+    """
+    Parse a version 1.0 .npy file into its header and the cells.
+    """
+    assert content[:8] == b"\x93NUMPY\x01\x00"
+    header_length = int.from_bytes(content[8:10], "little")
+    header = content[10 : 10 + header_length].decode("latin-1")
+    return ast.literal_eval(header), content[10 + header_length :], header
+
+
+def test_npy_file_header():
+    """
+    The header describes the array, and is padded (ending with a newline)
+    so the data starts on a 64 byte boundary.
+    """
+    content = build_output.npy_file(array("H", [1, 0, 2, 3, 0, 1]), (2, 3))
+    header, data, raw_header = read_npy(content)
+    assert header == {"descr": "<u2", "fortran_order": False, "shape": (2, 3)}
+    assert raw_header.endswith("\n")
+    assert (10 + len(raw_header)) % 64 == 0
+    assert array("H", data).tolist() == [1, 0, 2, 3, 0, 1]
+    content = build_output.npy_file(array("I", [70000]), (1, 1))
+    header, data, _ = read_npy(content)
+    assert header["descr"] == "<u4"
+    assert int.from_bytes(data, "little") == 70000
+
+
+def test_support_matrix(api_dir):
+    """
+    Each cell is 0 if the release doesn't include the package, otherwise 1
+    + the position of the package's version in the versions list.
+    """
+    all_packages = {
+        "numpy": {
+            "status": "green",
+            "pyodide_versions": {
+                "0.29.1": {"package_version": "2.2.5"},
+                "0.9.0": {"package_version": "1.15.0"},
+            },
+        },
+        "arrr": {
+            "status": "amber",
+            "pyodide_versions": {"0.29.1": {"package_version": "1.0"}},
+        },
+        "unsupported": {"status": "red"},
+    }
+    build_data.build_support_matrix(all_packages)
+    header = json.loads((api_dir / "matrix.json").read_text())
+    assert header["packages"] == ["arrr", "numpy", "unsupported"]
+    assert header["statuses"] == ["amber", "green", "red"]
+    assert header["releases"] == ["0.9.0", "0.29.1"]
+    assert header["shape"] == [3, 2]
+    npy_header, data, _ = read_npy((api_dir / "matrix.npy").read_bytes())
+    assert npy_header["shape"] == (3, 2)
+    cells = array("H", data).tolist()
+    versions = header["versions"]
+    assert cells[0:2] == [0, versions.index("1.0") + 1]
+    assert cells[2:4] == [
+        versions.index("1.15.0") + 1,
+        versions.index("2.2.5") + 1,
+    ]
+    assert cells[4:6] == [0, 0]
+    lookup = json.loads((api_dir / "lookup.json").read_text())
+    assert lookup["packages"]["unsupported"] == ["unsupported", "red", []]
+    assert lookup["packages"]["numpy"][2] == cells[2:4]
+
+
+def test_support_matrix_loads_with_numpy(api_dir):
+    numpy = pytest.importorskip("numpy")
+    all_packages = {
+        "numpy": {"pyodide_versions": {"0.29.1": {"package_version": "2.2.5"}}},
+        "arrr": {"pyodide_versions": {"0.27.7": {"package_version": "1.0"}}},
+    }
+    build_data.build_support_matrix(all_packages)
+    matrix = numpy.load(io.BytesIO((api_dir / "matrix.npy").read_bytes()))
+    assert matrix.dtype == numpy.uint16
+    assert matrix.tolist() == [[1, 0], [0, 2]]
@@ -0,0 +1,176 @@
+"""
+Tests for filing packages under their PEP 503 normalized names, including
+migrating the files of older builds named otherwise.
+"""
+import json
+
+import pytest
+
+import build_data
+import build_log
+import package_store
+
+
+@pytest.fixture
+def package_dir(tmp_path):
+    build_data.configure(["-q"])
+    path = tmp_path / "api" / "package"
+    path.mkdir(parents=True)
+    return path
+
+
+def write_record(package_dir, package_name, record):
+    (package_dir / f"{package_name}.json").write_text(json.dumps(record))
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [
+        ("Pillow", "pillow"),
+        ("ruamel.yaml", "ruamel-yaml"),
+        ("pydantic_core", "pydantic-core"),
+        ("Foo-_.Bar", "foo-bar"),
+        (" numpy ", "numpy"),
+    ],
+)
+def test_normalize_name(name, expected):
+    assert package_store.normalize_name(name) == expected
+
+
+def test_merge_records_prefers_the_latest_update():
+    old = {
+        "status": "amber",
+        "notes": "Old notes.",
+        "updated_at": "2025-01-01T00:00:00+00:00",
+        "pyodide_versions": {"0.29.1": {"package_version": "11.0"}},
+        "pypi": {"author": "Someone"},
+    }
+    new = {
+        "status": "green",
+        "notes": "New notes.",
+        "updated_at": "2025-06-01T00:00:00+00:00",
+        "pyodide_versions": {"0.27.7": {"package_version": "10.0"}},
+    }
+    merged = package_store.merge_records([old, new])
+    assert merged["status"] == "green"
+    # The notes stay with the Pyodide support they describe (the pyodide
+    # stage regenerates both if that's out of date), and missing details are
+    # filled in.
+    assert merged["notes"] == "New notes."
+    assert merged["pyodide_versions"] == new["pyodide_versions"]
+    assert merged["pypi"] == {"author": "Someone"}
+
+
+def test_merge_records_keeps_notes_with_their_html():
+    notes = {
+        "notes": "*Old*",
+        "notes_html": "<p><em>Old</em></p>",
+        "updated_at": "2025-01-01T00:00:00+00:00",
+    }
+    assert package_store.merge_records(
+        [notes, {"notes": "*New*", "updated_at": "2025-06-01T00:00:00+00:00"}]
+    ) == {"notes": "*New*", "updated_at": "2025-06-01T00:00:00+00:00"}
+    assert package_store.merge_records(
+        [notes, {"status": "red", "updated_at": "2025-06-01T00:00:00+00:00"}]
+    ) == {
+        "status": "red",
+        "notes": "*Old*",
+        "notes_html": "<p><em>Old</em></p>",
+        "updated_at": "2025-06-01T00:00:00+00:00",
+    }
+
+
+def test_merge_records_breaks_ties_on_the_newest_release():
+    stale = {
+        "notes": "Stale.",
+        "updated_at": "2025-01-01T00:00:00+00:00",
+        "pyodide_versions": {"0.27.7": {}},
+    }
+    current = {
+        "notes": "Current.",
+        "updated_at": "2025-01-01T00:00:00+00:00",
+        "pyodide_versions": {"0.29.1": {}},
+    }
+    assert package_store.merge_records([current, stale])["notes"] == "Current."
+    assert package_store.merge_records([stale, current])["notes"] == "Current."
+
+
+def test_migration(package_dir):
+    """
+    Files of the same package under different spellings are merged into the
+    file of its normalized name, and the other spellings become aliases.
+    """
+    write_record(
+        package_dir,
+        "Pillow",
+        {"status": "green", "updated_at": "2025-06-01T00:00:00+00:00"},
+    )
+    write_record(
+        package_dir,
+        "pillow",
+        {"status": "amber", "updated_at": "2025-01-01T00:00:00+00:00"},
+    )
+    write_record(package_dir, "ruamel.yaml", {"status": "green"})
+    write_record(package_dir, "numpy", {"status": "green"})
+    store = package_store.PackageStore(str(package_dir))
+    assert store.names() == ["numpy", "pillow", "ruamel-yaml"]
+    assert store.get("PILLOW")["status"] == "green"
+    store.flush()
+    assert sorted(path.name for path in package_dir.iterdir()) == [
+        "numpy.json",
+        "pillow.json",
+        "ruamel-yaml.json",
+    ]
+    aliases = json.loads((package_dir.parent / "aliases.json").read_text())
+    assert aliases == {"Pillow": "pillow", "ruamel.yaml": "ruamel-yaml"}
+    # Once migrated, there's nothing left to do.
+    store = package_store.PackageStore(str(package_dir))
+    assert not store.dirty
+
+
+def test_migration_dry_run(package_dir):
+    """
+    A dry run leaves the files as they were.
+    """
+    build_data.configure(["-q", "--dry-run"])
+    write_record(package_dir, "Pillow", {"status": "green"})
+    store = package_store.PackageStore(str(package_dir))
+    store.flush()
+    assert [path.name for path in package_dir.iterdir()] == ["Pillow.json"]
+
+
+def test_alias(package_dir):
+    store = package_store.PackageStore(str(package_dir))
+    assert store.alias("Jinja2") == "jinja2"
+    assert store.alias("numpy") == "numpy"
+    store.put("jinja2", {"status": "green"})
+    store.flush()
+    aliases = json.loads((package_dir.parent / "aliases.json").read_text())
+    assert aliases == {"Jinja2": "jinja2"}
+
+
+def test_write_packages_only_touches_changed_records(package_dir, monkeypatch):
+    """
+    Only the notes of changed records are rendered, so a run that changes
+    nothing reads no package files.
+    """
+    monkeypatch.chdir(package_dir.parent.parent)
+    write_record(package_dir, "numpy", {"notes": "*Old*"})
+    write_record(package_dir, "arrr", {"notes": "*Arrr*"})
+    build_log.stats.clear()
+    store = package_store.PackageStore(str(package_dir))
+    build_data.write_packages(store, {}, "2026-01-01T00:00:00+00:00")
+    assert build_log.stats["setup"]["files_read"] == 0
+    assert "notes_html" not in json.loads((package_dir / "numpy.json").read_text())
+    store = package_store.PackageStore(str(package_dir))
+    store.put("numpy", {"notes": "*New*"})
+    build_data.write_packages(store, {}, "2026-01-01T00:00:00+00:00")
+    numpy = json.loads((package_dir / "numpy.json").read_text())
+    assert numpy["notes_html"] == "<p><em>New</em></p>"
+    assert "notes_html" not in json.loads((package_dir / "arrr.json").read_text())
+    build_data.configure(["-q", "--render-notes"])
+    build_data.write_packages(
+        package_store.PackageStore(str(package_dir)), {}, "2026-01-01T00:00:00+00:00"
+    )
+    arrr = json.loads((package_dir / "arrr.json").read_text())
+    assert arrr["notes_html"] == "<p><em>Arrr</em></p>"
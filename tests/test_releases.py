@@ -0,0 +1,141 @@
+"""
+Tests for putting the Pyodide releases in version order, and the changes
+feed of what changed from one release to the next.
+"""
+import json
+
+import pytest
+
+import build_data
+import releases
+
+
+@pytest.fixture
+def api_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    build_data.configure(["-q"])
+    path = tmp_path / "api"
+    path.mkdir()
+    return path
+
+
+def test_release_key():
+    """
+    Releases sort by version, not alphabetically.
+    """
+    versions = ["0.29.1", "0.9.0", "0.29.0", "0.100.0", "0.27.10", "0.27.7"]
+    assert sorted(versions, key=releases.release_key) == [
+        "0.9.0",
+        "0.27.7",
+        "0.27.10",
+        "0.29.0",
+        "0.29.1",
+        "0.100.0",
+    ]
+    assert "0.9" > "0.29"
+    assert releases.release_key("0.9") < releases.release_key("0.29")
+
+
+def test_release_index():
+    """
+    The index puts the releases in version order (ignoring the "latest" and
+    "stable" aliases), and maps each to the newest PyScript release using it.
+    """
+    index = releases.ReleaseIndex(
+        ["0.9.0", "latest", "0.29.0", "0.26.4", "stable", "0.27.7"]
+    )
+    assert index.releases == ["0.9.0", "0.26.4", "0.27.7", "0.29.0"]
+    assert index.latest == "0.29.0"
+    assert index.ordinals["0.27.7"] == 2
+    # Several PyScript releases use each of these.
+    assert index.pyscript_releases["0.26.4"] == ["2024.11.1", "2025.2.1"]
+    assert index.pyscript_version("0.26.4") == "2025.2.1"
+    assert index.pyscript_version("0.27.7") == "2025.7.3"
+    assert index.pyscript_version("0.29.0") == "2025.11.1"
+    assert index.pyscript_version("0.9.0") == "unknown"
+    assert index.pyscript_version("0.1.0") == "unknown"
+    assert index.pyscript_versions == [
+        "unknown",
+        "2025.2.1",
+        "2025.7.3",
+        "2025.11.1",
+    ]
+    assert index.newest_first(["0.9.0", "0.29.0", "0.27.7"]) == [
+        "0.29.0",
+        "0.27.7",
+        "0.9.0",
+    ]
+
+
+def test_pyodide_notes_newest_first():
+    """
+    The notes list the releases including the package newest first, by
+    version.
+    """
+    index = releases.ReleaseIndex(["0.9.0", "0.29.1"])
+    data = {
+        "0.9.0": {"package_version": "1.0", "pyscript_version": "unknown"},
+        "0.29.1": {"package_version": "2.0", "pyscript_version": "2026.1.1"},
+    }
+    notes = build_data.pyodide_notes("arrr", data, True, index)
+    assert notes.index("* 0.29.1: arrr (2.0)") < notes.index("* 0.9.0: arrr")
+    assert "[PyScript 2026.1.1]" in notes
+
+
+def test_release_changes(api_dir):
+    """
+    Each release's added, removed and updated packages are worked out from
+    the release before it (in version order, with names compared as per PEP
+    503), and changes.json lists the releases newest first.
+    """
+    package_data = {
+        "0.29.1": {"numpy": "2.2.5", "Jinja2": "3.1.6", "arrr": "1.0"},
+        "0.9.0": {"numpy": "1.15.0", "pandas": "0.23.0"},
+        "0.27.7": {"numpy": "2.0.2", "jinja2": "3.1.4", "pandas": "2.2.3"},
+    }
+    index = releases.ReleaseIndex(package_data)
+    build_data.build_release_changes(package_data, index)
+    feed = json.loads((api_dir / "changes.json").read_text())
+    assert feed["latest_release"] == "0.29.1"
+    assert [entry["release"] for entry in feed["releases"]] == [
+        "0.29.1",
+        "0.27.7",
+        "0.9.0",
+    ]
+    assert feed["releases"][0] == {
+        "release": "0.29.1",
+        "previous_release": "0.27.7",
+        "pyscript_version": "2026.1.1",
+        "added": 1,
+        "removed": 1,
+        "updated": 2,
+    }
+    changes = json.loads((api_dir / "changes" / "0.29.1.json").read_text())
+    assert changes["added"] == {"arrr": "1.0"}
+    assert changes["removed"] == {"pandas": "2.2.3"}
+    assert changes["updated"] == {
+        "jinja2": {"from": "3.1.4", "to": "3.1.6"},
+        "numpy": {"from": "2.0.2", "to": "2.2.5"},
+    }
+    first = json.loads((api_dir / "changes" / "0.9.0.json").read_text())
+    assert first["previous_release"] is None
+    assert first["added"] == {"numpy": "1.15.0", "pandas": "0.23.0"}
+
+
+def test_release_changes_removes_old_releases(api_dir):
+    """
+    The changes of releases no longer in the Pyodide data are removed.
+    """
+    package_data = {"0.27.7": {"numpy": "2.0.2"}, "0.29.1": {"numpy": "2.2.5"}}
+    build_data.build_release_changes(
+        package_data, releases.ReleaseIndex(package_data)
+    )
+    del package_data["0.27.7"]
+    build_data.build_release_changes(
+        package_data, releases.ReleaseIndex(package_data)
+    )
+    assert [path.name for path in (api_dir / "changes").iterdir()] == [
+        "0.29.1.json"
+    ]
+    feed = json.loads((api_dir / "changes.json").read_text())
+    assert feed["releases"][0]["added"] == 1